@@ -1,24 +1,42 @@
 #include "reg52.h"
 
+// 协议版本 2: AA 02 CMD P0 P1 P2 P3 CHK 55
+// 应答:       A5 02 CMD P0 P1 P2 P3 CHK 5A, P0~P3 为实际输出的端口状态
+// CHK 为从版本号到 P3 的异或校验, 校验失败时应答 CMD | 0x80
+// 旧协议 AA P0 P1 P2 P3 55 仍然兼容, 按字节回传
+// P0/P1 为电阻箱两个通道, P2/P3.2~P3.7 为多工位夹具的继电器矩阵 (低电平有效)
+#define VERSION   0x02
+#define CMD_SET   0x01
+#define CMD_QUERY 0x02
+#define CMD_NAK   0x80
+
+#define STATE_IDLE   0xFF
+#define STATE_HEAD   0x10
+#define STATE_FRAME  0x20
+#define STATE_TAIL   0x30
+
 unsigned char state;
 unsigned char buf[4];
+unsigned char port[4];
+unsigned char frame[6]; // CMD P0 P1 P2 P3 CHK
+unsigned char ack[9];
+unsigned char ack_pos = sizeof(ack);
 
 void uart_init()
 {
     SCON=0X50;			//设置为工作方式1
 		TMOD=0X20;			//设置计数器工作方式2
 		PCON=0X80;			//波特率加倍
-		TH1=0XFA;				//计数器初始值设置，注意波特率是9600的
-		TL1=0XFA;
+		TH1=0XFF;				//计数器初始值设置，波特率为57600 (11.0592MHz)
+		TL1=0XFF;
 		ES=1;						//打开接收中断
 		EA=1;						//打开总中断
 		TR1=1;					//打开计数器
-    SBUF = 0x00;
 }
 
 void resetBuf()
 {
-    state = 0xFF;
+    state = STATE_IDLE;
     buf[0] = 0;
     buf[1] = 0;
     buf[2] = 0;
@@ -27,62 +45,119 @@ void resetBuf()
 
 void applyBuf()
 {
-    P0 = buf[0];
-    P1 = buf[1];
-    P2 = buf[2];
-    P3 = buf[3];
+    P0 = port[0] = buf[0];
+    P1 = port[1] = buf[1];
+    P2 = port[2] = buf[2];
+    P3 = port[3] = buf[3] | 0x03; // P3.0/P3.1 为串口引脚, 保持高电平
 }
 
-unsigned char readByte()
+unsigned char checksum(unsigned char *bytes, unsigned char len)
+{
+	unsigned char i, chk = VERSION;
+	for(i = 0; i < len; ++i) chk ^= bytes[i];
+	return chk;
+}
+
+void sendAck(unsigned char cmd)
+{
+	unsigned char i;
+	ack[0] = 0xA5;
+	ack[1] = VERSION;
+	ack[2] = cmd;
+	for(i = 0; i < 4; ++i) ack[3 + i] = port[i];
+	ack[7] = checksum(ack + 2, 5);
+	ack[8] = 0x5A;
+
+	// 剩余字节在发送中断里依次发出
+	ack_pos = 1;
+	SBUF = ack[0];
+}
+
+void handleFrame()
+{
+	unsigned char i, cmd = frame[0];
+	if(checksum(frame, 5) != frame[5])
+	{
+		sendAck(cmd | CMD_NAK);
+		return;
+	}
+	if(cmd == CMD_SET)
+	{
+		for(i = 0; i < 4; ++i) buf[i] = frame[1 + i];
+		applyBuf();
+	}
+	sendAck(cmd);
+}
+
+void readByte()
 {
 	unsigned char sbuf;
+	bit echo = 0; // 旧协议需要按字节回传
   RI = 0; // 清除接收中断标志位
-	
+
 	sbuf = SBUF;
 	switch(state)
 	{
-	case 0xFF:
+	case STATE_IDLE:
 			if(sbuf != 0xAA) break;
-			state = 0;
+			state = STATE_HEAD;
+			echo = 1;
+			break;
+	case STATE_HEAD:
+			if(sbuf == VERSION)
+			{
+				state = STATE_FRAME;
+				break;
+			}
+			buf[0] = sbuf;
+			state = 1;
+			echo = 1;
 			break;
-	case 0:
 	case 1:
 	case 2:
 	case 3:
 			buf[state] = sbuf;
-			SBUF = buf[state];
 			state += 1;
+			echo = 1;
 			break;
 	case 4:
+			echo = 1;
 			if(sbuf == 0x55) applyBuf();
+			resetBuf();
+			break;
+	case STATE_TAIL:
+			if(sbuf == 0x55) handleFrame();
+			resetBuf();
+			break;
 	default:
+			if(state >= STATE_FRAME && state < STATE_FRAME + sizeof(frame))
+			{
+				frame[state - STATE_FRAME] = sbuf;
+				state += 1;
+				if(state == STATE_FRAME + sizeof(frame)) state = STATE_TAIL;
+				break;
+			}
 			resetBuf();
 			break;
 	}
-	return sbuf;
-}
-
-void writeByte(unsigned char sbuf)
-{
-	SBUF = sbuf;
-	TI = 1;
+	if(echo) SBUF = sbuf;
 }
 
 void uart() interrupt 4 //串口通信中断函数
 {
-		unsigned char cache;
-    if(TI) TI = 0; // 清除发送中断标志位
-    if(RI)
+    if(TI)
     {
-				cache = readByte(); // 处理接收到的数据
-				writeByte(cache); // 回传数据
+        TI = 0; // 清除发送中断标志位
+        if(ack_pos < sizeof(ack)) SBUF = ack[ack_pos++];
     }
+    if(RI) readByte(); // 处理接收到的数据
 }
 
 void main()
 {
     uart_init();
     resetBuf();
+    port[0] = port[1] = port[2] = port[3] = 0xFF;
     while(1);
 }
 
@@ -1,3 +1,5 @@
 import logging
+from pathlib import Path
 
 global_logger = logging.getLogger(__name__)
+config_dir = Path.home() / '.mil-std-750'
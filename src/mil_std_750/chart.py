@@ -55,8 +55,13 @@ class Chart(QtCharts.QChart):
         self.target.setName('目标测试点')
         self._add(self.target)
 
+        self.boundary = QtCharts.QLineSeries(self)
+        self.boundary.setName('SOA边界')
+        self._add(self.boundary)
+        self.boundary.setVisible(False)
+
         self.traces: list[TestTrace] = []
-        self.trace: TestTrace | None = None
+        self.current: dict[int, TestTrace] = {} # 各工位正在测试的目标
 
     def _add(self, series: QtCharts.QAbstractSeries):
         self.addSeries(series)
@@ -76,26 +81,33 @@ class Chart(QtCharts.QChart):
         top_Ic = 10 ** (math.ceil(math.log10(max_Ic)) + 0.2)
         self.ay.setRange(5e-5, top_Ic)
 
-    def make_trace(self):
-        if self.trace:
-            for marker in self.legend().markers(self.trace):
+    def set_boundary(self, curve: list[tuple[float, float]]):
+        points = [QPointF(v, i) for v, i in sorted(curve) if v > 0 and i > 0]
+        self.boundary.replace(points)
+        self.boundary.setVisible(bool(points))
+
+    def make_trace(self, socket: int = 0):
+        if (previous := self.current.get(socket)) is not None:
+            for marker in self.legend().markers(previous):
                 marker.setVisible(False)
 
-        self.trace = trace = TestTrace(self)
+        trace = TestTrace(self)
+        if socket: trace.setName(f'工位{socket + 1}实测值')
         self._add(trace)
         self._add(trace.curren_point)
         self.traces.append(trace)
+        self.current[socket] = trace
         return trace
     
-    def add_test_point(self, Vce: float, Ic: float):
-        if not self.trace: 
+    def add_test_point(self, Vce: float, Ic: float, socket: int = 0):
+        if (trace := self.current.get(socket)) is None:
             _log.error('no trace')
             return
-        self.trace.add_test_point(Vce, Ic)
+        trace.add_test_point(Vce, Ic)
 
     def restart(self):
         for trace in self.traces:
             self.removeSeries(trace.curren_point)
             self.removeSeries(trace)
             
-        self.trace = None
+        self.current.clear()
@@ -0,0 +1,134 @@
+import logging, asyncio, csv, random, time
+from datetime import datetime
+from dataclasses import dataclass
+from PySide6.QtCore import QObject, Signal
+from ..types import ResistCalibration
+from ..resist import values, ohm_to_float
+from ..worker.common import DeviceWorker, Context
+from .. import config_dir
+
+_log = logging.getLogger(__name__)
+
+# 校准夹具接线: 电阻箱通道 -> (电源, 电流表, 跨接在该通道电阻两端的电压表)
+_channels = {
+    1: ('Power2', 'DMM5', 'DMM3'),
+    2: ('Power1', 'DMM4', 'DMM2'),
+}
+
+# 各档位的测试电流 (A), 保证压降足够大且电阻功耗不超过 1W
+_test_currents = {
+    '0': 1.0,
+    '1': 1.0,
+    '10': 0.1,
+    '100': 0.03,
+    '1k': 0.005,
+    '10k': 0.0005,
+    '100k': 0.00005,
+}
+
+_samples = 20
+
+@dataclass
+class CalibrationPoint:
+    channel: int
+    decade: str
+    current1: float
+    volt1: float
+    current2: float
+    volt2: float
+
+    @property
+    def nominal(self):
+        return ohm_to_float(self.decade)
+
+    @property
+    def measured(self):
+        # 两个电流点求差分电阻, 消除热电势和表头零点偏移
+        return (self.volt1 - self.volt2) / (self.current1 - self.current2)
+
+    def row(self):
+        deviation = (self.measured - self.nominal) / self.nominal if self.nominal else float('nan')
+        return [
+            self.channel, self.decade, self.nominal,
+            f'{self.current1:.6g}', f'{self.volt1:.6g}',
+            f'{self.current2:.6g}', f'{self.volt2:.6g}',
+            f'{self.measured:.6g}', f'{deviation:.3%}',
+        ]
+
+class CalibrationRunner(QObject):
+    '''
+    电阻箱计量: 两个通道同时逐档切换, 电源以限流方式输出已知电流,
+    电流表和电压表并行读数, 生成校准报告和电阻箱使用的校准表
+    '''
+    calibrated = Signal(dict)
+
+    def __init__(self, context: Context):
+        super().__init__(context)
+        self.context = context
+
+    async def run(self, device: DeviceWorker):
+        self.device = device
+        begin = time.monotonic()
+
+        points: list[CalibrationPoint] = []
+        for decade in values.values():
+            self.context.check_abort()
+            await device.R.set_resists(decade, decade)
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(self.measure(channel, decade)) for channel in _channels]
+            points.extend(task.result() for task in tasks)
+        await device.R.reconfig()
+
+        table: ResistCalibration = {}
+        for point in points:
+            table.setdefault(str(point.channel), {})[point.decade] = point.measured
+            _log.info(f'[calibrate] 通道{point.channel} {point.decade}: {point.measured:.6g}Ω')
+
+        path = self.report(points)
+        _log.info(f'[calibrate] 校准完成, 耗时 {time.monotonic() - begin:.1f}s, 报告保存至 {path}')
+        self.calibrated.emit(table)
+        self.context.message.emit(f'电阻箱校准完成，报告保存至 {path}')
+
+    async def measure(self, channel: int, decade: str):
+        power_name, ammeter, voltmeter = _channels[channel]
+        power = getattr(self.device, power_name)
+        current = _test_currents[decade]
+        nominal = ohm_to_float(decade)
+
+        readings: list[tuple[float, float]] = []
+        if self.device.fake:
+            for i in [current, current * 0.5]:
+                r = nominal * random.gauss(1, 0.002) + 0.05
+                readings.append((i, i * r))
+            return CalibrationPoint(channel, decade, *readings[0], *readings[1])
+
+        dmms = self.device._dmms
+        # 经过 MultiMeter 设置量程, 保持其量程缓存与仪器一致
+        await dmms.set_curr_range(**{ ammeter: current * 1.2 })
+        await dmms.set_volt_range(**{ voltmeter: current * 1.2 * (nominal + 1) })
+
+        power.set_voltage(0)
+        with power:
+            for i in [current, current * 0.5]:
+                # 电压设在压降以上, 电源工作在限流状态, 输出电流即为测试电流
+                power.set_limit_current(i)
+                power.set_voltage(current * (nominal * 2 + 1) + 0.5)
+                await asyncio.sleep(0.200)
+                async with asyncio.TaskGroup() as tg:
+                    fi = tg.create_task(dmms[ammeter].sample(_samples))
+                    fv = tg.create_task(dmms[voltmeter].sample(_samples))
+                ii, vv = fi.result(), fv.result()
+                if not ii or not vv: raise Exception(f'[calibrate] 通道{channel} {decade} 读数为空')
+                readings.append((sum(ii) / len(ii), sum(vv) / len(vv)))
+            power.set_voltage(0)
+        return CalibrationPoint(channel, decade, *readings[0], *readings[1])
+
+    def report(self, points: list[CalibrationPoint]):
+        folder = config_dir / 'calibration'
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f'resist-{datetime.now():%Y%m%d-%H%M%S}.csv'
+        with open(path, 'w', encoding='utf-8-sig') as file:
+            writer = csv.writer(file, dialect='excel', lineterminator='\n')
+            writer.writerow(['通道', '档位', '标称值/Ω', 'I1/A', 'V1/V', 'I2/A', 'V2/V', '实测值/Ω', '偏差'])
+            for point in points: writer.writerow(point.row())
+        return path
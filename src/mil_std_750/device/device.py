@@ -1,12 +1,13 @@
 from PySide6 import QtWidgets
 from PySide6.QtCore import Signal, Qt, Slot
 from PySide6.QtSerialPort import QSerialPortInfo
-from ..types import Devices
+from ..types import Devices, ResistCalibration
 from .device_ui import Ui_DevicePanel
 
 class DevicePanel(QtWidgets.QScrollArea):
     connectRequested = Signal(str)
     disconnectRequested = Signal(str)
+    calibrateRequested = Signal()
 
     def __init__(self, parent = None):
         super().__init__(parent)
@@ -38,7 +39,9 @@ class DevicePanel(QtWidgets.QScrollArea):
             self.ui.grid.addWidget(ip, row, 4, Qt.AlignmentFlag.AlignCenter)
             self.devices[name] = ip
 
+        self.resist_calibration: ResistCalibration = {}
         self.ui.refreshPort.clicked.connect(self.update_serial_info)
+        self.ui.btnCalibrate.clicked.connect(self.calibrateRequested)
         self._refresh_ports()
 
     def update_serial_info(self):
@@ -64,6 +67,10 @@ class DevicePanel(QtWidgets.QScrollArea):
         else:
             self.ui.resist.setCurrentText('COM3')
 
+    @Slot(dict)
+    def set_resist_calibration(self, table: ResistCalibration):
+        self.resist_calibration = table
+
     def get_devices(self) -> Devices:
         return Devices(
             dmms = [self.devices[f'DMM{i}'].text() for i in range(1, 6)],
@@ -71,11 +78,15 @@ class DevicePanel(QtWidgets.QScrollArea):
             power2 = self.devices['Power2'].text(),
             resist = self.ui.resist.currentText(),
             fake = self.ui.fake_device.isChecked(),
+            resist_calibration = self.resist_calibration,
+            sockets = self.ui.sockets.value(),
         )
 
     def save(self):
         data = { name: box.text() for name, box in self.devices.items() }
         data['R'] = self.ui.resist.currentText()
+        data['R_calibration'] = self.resist_calibration
+        data['sockets'] = self.ui.sockets.value()
         return data
 
     def load(self, data: dict):
@@ -97,3 +108,5 @@ class DevicePanel(QtWidgets.QScrollArea):
         resist = data.get('R', 'COM3')
         self._refresh_ports()
         self._set_resist_port(resist)
+        self.resist_calibration = data.get('R_calibration', {})
+        self.ui.sockets.setValue(data.get('sockets', 1))
@@ -15,6 +15,20 @@ plc_to_rate = {
 
 _data_points_pattern = re.compile(rb'#(\d)(.*)')
 
+# 万用表量程, 测量值不超过量程的 90%
+volt_ranges = [('200mV', 200e-3), ('2V', 2.), ('20V', 20.), ('200V', 200.), ('1000V', 1000.)]
+curr_ranges = [('200uA', 200e-6), ('2mA', 2e-3), ('20mA', 20e-3), ('200mA', 200e-3), ('2A', 2.), ('10A', 10.)]
+
+def volt_range(volt: float):
+    for text, value in volt_ranges:
+        if abs(volt) < value * 0.90: return text, value
+    raise Exception(f'测试电压 {volt}V 超过万用表最大量程')
+
+def curr_range(curr: float):
+    for text, value in curr_ranges:
+        if abs(curr) < value * 0.90: return text, value
+    raise Exception('测试电流超过万用表最大量程')
+
 def top(values: list[float], step: float):
     assert values
     mid = (max(values) + min(values)) / 2
@@ -73,24 +87,16 @@ class _Meter:
             _log.warning(f'[{self.name}] reconfig opc: {opc}')
 
     async def set_volt_range(self, volt: float):
-        texts = ['200mV', '2V', '20V', '200V', '1000V']
-        values = [200e-3, 2., 20., 200., 1000.]
-        for text, value in zip(texts, values):
-            if abs(volt) < value * 0.90:
-                await self.write(f'SENSe:VOLTage:DC:RANGe {text}')
-                _log.debug(f'[{self.name}] 设置电压量程: {text}')
-                return value
-        raise Exception(f'测试电压 {volt}V 超过万用表最大量程')
+        text, value = volt_range(volt)
+        await self.write(f'SENSe:VOLTage:DC:RANGe {text}')
+        _log.debug(f'[{self.name}] 设置电压量程: {text}')
+        return value
         
     async def set_curr_range(self, curr: float):
-        texts = ['200uA', '2mA', '20mA', '200mA', '2A', '10A']
-        values = [200e-6, 2e-3, 20e-3, 200e-3, 2., 10.]
-        for text, value in zip(texts, values):
-            if abs(curr) < value * 0.90:
-                await self.write(f'SENSe:CURRent:DC:RANGe {text}')
-                _log.debug(f'[{self.name}] 设置电流量程: {text}')
-                return value
-        raise Exception('测试电流超过万用表最大量程')
+        text, value = curr_range(curr)
+        await self.write(f'SENSe:CURRent:DC:RANGe {text}')
+        _log.debug(f'[{self.name}] 设置电流量程: {text}')
+        return value
         
     # async def config_sample(self, plc: str, duration: float = 0.200):
     #     sample = int(plc_to_rate[plc] * duration)
@@ -141,10 +147,25 @@ class _Meter:
 
         return [parser(d) for d in data.split(b',')]
 
+    async def sample(self, count: int, plc: str = '1') -> list[float]:
+        '''内部触发立即采集 count 个点, 用于不依赖电源触发信号的计量'''
+        await self.write(
+            f'{self.func}:NPLC {plc}',
+            f'SAMPle:COUNt {count}',
+            b'TRIGger:COUNt 1',
+            b'TRIGger:SOURce IMMediate',
+            b'INIT',
+        )
+        opc = await self.query(b'*OPC?', timeout=count / plc_to_rate[plc] + 3)
+        if opc != b'1':
+            _log.warning(f'[{self.name}] sample opc: {opc}')
+        return await self.acquire_one(float)
+
 class MultiMeter:
     def __init__(self, fake: bool = False):
         self._fake = fake
         self.streams: dict[str, tuple[StreamReader, StreamWriter]] = {}
+        self._ranges: dict[str, str] = {} # 各表当前的量程, 相同时不再重复设置
 
     def __getitem__(self, name: str):
         return _Meter(name, *self.streams[name], self._fake)
@@ -180,6 +201,7 @@ class MultiMeter:
         self.streams.clear()
 
     async def reconfig(self):
+        self._ranges.clear()
         async with asyncio.TaskGroup() as tg:
             for meter in self._all():
                 tg.create_task(meter.reconfig())
@@ -187,13 +209,21 @@ class MultiMeter:
     async def set_volt_range(self, **volts: float):
         actual_values: dict[str, float] = {}
         for name, volt in volts.items():
-            actual_values[name] = await self[name].set_volt_range(volt)
+            text, value = volt_range(volt)
+            if self._ranges.get(name) != text:
+                await self[name].set_volt_range(volt)
+                self._ranges[name] = text
+            actual_values[name] = value
         return actual_values
     
     async def set_curr_range(self, **currs: float):
         actual_values: dict[str, float] = {}
         for name, curr in currs.items():
-            actual_values[name] = await self[name].set_curr_range(curr)
+            text, value = curr_range(curr)
+            if self._ranges.get(name) != text:
+                await self[name].set_curr_range(curr)
+                self._ranges[name] = text
+            actual_values[name] = value
         return actual_values
 
     async def auto_sample(self, total_duration: float, plc: str = '0.1'):
@@ -129,7 +129,12 @@ class ExecPanel(QtWidgets.QWidget):
         self.ui.listRefer.addItem(item)
         self._set_current_item(item)
 
-    def receive_refer_results(self, refer: ReferResults):
+    def receive_refer_results(self, results: list[ReferResults]):
+        '''参考测试结束时收到各工位的结果, 每个工位生成一项持续测试参数'''
+        for refer in results:
+            self.add_refer_results(refer)
+
+    def add_refer_results(self, refer: ReferResults):
         arg = refer.argument
         earg = ExecArgument(
             name=arg.name, 
@@ -306,8 +311,8 @@ class ExecPanel(QtWidgets.QWidget):
     def restart(self):
         self.chart.restart()
 
-    def start_target(self):
-        self.chart.make_trace()
+    def start_target(self, socket: int = 0):
+        self.chart.make_trace(socket)
 
     def add_test_point(self, Vce: float, Ic: float):
         self.chart.add_test_point(Vce, Ic)
@@ -0,0 +1,179 @@
+import logging, asyncio, dataclasses, time
+from PySide6.QtCore import QObject, Signal
+from ..types import ExecArgument, ExecItem, ExecResult, ExecAllResult, Measurement
+from ..worker.common import TargetArgument, EventPoint, DeviceWorker, ChannelStore, Context, fake_chunks, vc_settled
+from ..worker.safety import BreakdownGuard
+from ..worker.window import SlidingWindow
+
+_log = logging.getLogger(__name__)
+
+_settle_time = 10.0 # Vc 阶段等待 Vce 稳定的最长时间 (s)
+
+class ExecRunner(QObject):
+    execTested = Signal(ExecResult)
+    execComplete = Signal(ExecAllResult)
+
+    def __init__(self, arg: ExecArgument, context: Context):
+        super().__init__(context)
+        self.context = context
+        self.arg = arg
+
+    async def run(self, device: DeviceWorker):
+        self.device = device
+        all_results = ExecAllResult([])
+        begin = time.monotonic()
+        for index, item in enumerate(self.arg.items):
+            _log.info(f'[exec] 第 {index + 1}/{len(self.arg.items)} 项: Vce={item.Vce}V, Ic={item.Ic}A, '
+                      f'Vc={item.Vc}V, Ve={item.Ve}V, Rc={item.Rc}, Re={item.Re}')
+            result = await ExecTest(item, self).run()
+            all_results.results.append(result)
+            self.execTested.emit(result)
+        _log.info(f'[exec] 完成 {len(self.arg.items)} 项, 共耗时 {time.monotonic() - begin:.3f}s')
+        self.execComplete.emit(all_results)
+
+class ExecTest:
+    '''
+    持续测试的一项: 以参考测试得到的 Vc, Ve 施加一次, Vce 稳定后输出 Ve,
+    固定等待 Ve_delay 后采集 duration 秒数据; 仪器调度、采集和安全保护与参考测试相同
+    '''
+    def __init__(self, item: ExecItem, runner: ExecRunner):
+        self.runner = runner
+        self.item = item
+        arg = runner.arg
+        self.targ = TargetArgument(
+            Vce=item.Vce if arg.type == 'NPN' else -item.Vce,
+            Ic=item.Ic,
+            Rc=item.Rc,
+            Re=item.Re,
+            Vc_max=item.Vc,
+            Ve_max=item.Ve,
+            Vceo=arg.Vceo,
+            Vebo=arg.Vebo,
+            Vcbo=arg.Vcbo,
+            output_time=item.duration,
+            total_time=_settle_time,
+        )
+        self.Rc, self.Re = self.device.resist_ohms(item.Rc, item.Re)
+
+    @property
+    def device(self):
+        return self.runner.device
+
+    async def setup_rig(self):
+        # 与参考测试相同的通道分配 (NPN: 通道一 Re, 通道二 Rc; PNP 相反), 以便复现参考测试得到的 Vc, Ve;
+        # 旧的 Worker.exec 的分配与参考测试正好相反
+        await self.device.set_resist(self.targ.Rc, self.targ.Re)
+
+        # 量程按参考测试的实测值设置
+        ranges = dataclasses.replace(self.targ, Vce=self.item.refer_Vce, Ic=self.item.refer_Ic)
+        rate, limits = await self.device.setup_dmm_ranges(ranges)
+        assert rate > 0, '无法设置万用表采样率'
+        return rate, limits
+
+    @property
+    def rig_config(self):
+        return (self.targ.Rc, self.targ.Re, self.item.refer_Vce, self.item.refer_Ic, self.targ.total_time)
+
+    async def run(self):
+        self.runner.context.check_abort()
+        item = self.item
+        begin = time.monotonic()
+        events = EventPoint(Vc=item.Vc, Ve=item.Ve)
+        results: dict[Measurement, list[float]] = { 'Vce': [], 'Ic': [], 'Ie': [], 'Vbe': [], 'Vcb': [] }
+
+        async with self.device.fixture.slot(0, self.rig_config, self.setup_rig) as rig:
+            self._rate, self._limits = rig
+            # 最新 100ms 数据检查限值, 最新 200ms 数据判断 Vc 阶段是否稳定
+            self._short = { meas: SlidingWindow(int(self._rate * 0.100), self._rate) for meas in ['Vce', 'Vcb', 'Vbe'] }
+            self._long = SlidingWindow(int(self._rate * 0.200), self._rate)
+            self._guard = BreakdownGuard(self.device, events, self._rate)
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self.device.power_control(events, self.targ), name='power_control')
+                tg.create_task(self.acquire_all(results, events), name='acquire_all')
+                tg.create_task(self.ve_delay(events), name='ve_delay')
+                tg.create_task(self.settle_timeout(events), name='settle_timeout')
+
+            b, e = self.mapping(events.ve_stop, events), self.mapping(events.output_stop, events)
+            assert b < e, f'采集数据范围错误: {b} >= {e}'
+            self.device.fixture.thermal.record(0, results['Vce'], results['Ic'], results['Vbe'][b:e], self._rate)
+
+        _log.info(f'[exec] Vc 稳定耗时 {events.ve_start - events.start:.3f}s, '
+                  f'Ve 输出 {events.ve_stop - events.ve_start:.3f}s, 采集 {events.output_stop - events.ve_stop:.3f}s, '
+                  f'本项共耗时 {time.monotonic() - begin:.3f}s (含冷却和仪器准备)')
+
+        # DMM2/DMM3 在 NPN 时为 Vbe/Vcb, PNP 时为 Vcb/Vbe
+        dmm2, dmm3 = ('Vbe', 'Vcb') if self.runner.arg.type == 'NPN' else ('Vcb', 'Vbe')
+        return ExecResult(
+            type=self.runner.arg.type,
+            item=item,
+            rate=self._rate,
+            ve_start=events.ve_start - events.start,
+            ve_stop=events.ve_stop - events.start,
+            output_stop=events.output_stop - events.start,
+            all_vce=results['Vce'],
+            all_dmm2=results[dmm2],
+            all_dmm3=results[dmm3],
+            all_ic=results['Ic'],
+            all_ie=results['Ie'],
+        )
+
+    async def ve_delay(self, events: EventPoint):
+        '''持续测试不判断 Ve 阶段是否稳定, 固定等待参考测试得到的 Ve_delay'''
+        await events.vc.wait()
+        await asyncio.sleep(self.item.Ve_delay)
+        events.ve_vce_stop = events.ve_ic_stop = time.monotonic()
+        events.ve_vce.set()
+        events.ve_ic.set()
+
+    async def settle_timeout(self, events: EventPoint):
+        try:
+            async with asyncio.timeout(self.targ.total_time):
+                await events.vc.wait()
+        except TimeoutError as e:
+            raise Exception('电路建立稳态的时间过长') from e
+
+    async def acquire_all(self, results: dict[Measurement, list[float]], events: EventPoint):
+        if not self.device.fake:
+            store = ChannelStore(results)
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self.device.read_channels(self._limits, store, events.output, self._guard.feed),
+                               name='read_channels')
+                while not store.finished:
+                    await store.next()
+                    self.runner.context.check_abort()
+                    if not events.output.is_set(): self.analyse(results, events)
+            return
+
+        while True:
+            await asyncio.sleep(0.100)  # 模拟采样间隔
+            samplecount = int(self._rate * 0.099)
+            self.runner.context.check_abort()
+
+            if events.state == 'start':
+                for values in results.values():
+                    values.clear()
+            else:
+                for meas, chunk in fake_chunks(events, results, self.runner.arg.type, self.Rc, samplecount).items():
+                    results[meas].extend(chunk)
+                    self._guard.feed(meas, chunk)
+
+            if events.output.is_set(): return
+            self.analyse(results, events)
+
+    def analyse(self, results: dict[Measurement, list[float]], events: EventPoint):
+        for meas, window in self._short.items():
+            window.feed(results[meas])
+        self._long.feed(results['Vce'])
+        self.check_limits()
+        # 与参考测试相同的 Vc 阶段稳定判据
+        if events.state == 'vc' and not events.vc.is_set() and vc_settled(self._long, events.Vc, self.targ.output_time):
+            events.vc.set()
+
+    def check_limits(self):
+        if self.device.fake: return
+        for meas, name, limit in [('Vce', 'Vceo', self.targ.Vceo), ('Vcb', 'Vcbo', self.targ.Vcbo), ('Vbe', 'Vebo', self.targ.Vebo)]:
+            if (last := self._short[meas]).full and abs(last.mean) > limit:
+                raise Exception(f'{meas} {last.mean} 超出 {name} 限值 {limit}')
+
+    def mapping(self, time: float, events: EventPoint):
+        return int((time - events.start) * self._rate)
@@ -0,0 +1,127 @@
+import logging, math
+from dataclasses import dataclass, field
+from typing import Literal
+from .types import ReferArgument, ExecArgument
+from .dmm import volt_range, curr_range
+from .resist import values, plan_resist, operating_point, ohm_to_float, auto, Vbe_typical
+from .power import PowerCV
+from .worker.thermal import ThermalBudget
+
+_log = logging.getLogger(__name__)
+
+_Vbe = Vbe_typical # 估算用的 Vbe
+_Ic_tolerance = 0.05 # 与 refer.task.direction 的默认判定范围一致
+_tail_time = 1.0 # 停止采集后 Vc 回落到 Ve 的等待时间
+_settle_time = 0.5 # 没有缓存时 Vc, Ve 阶段各自的预估稳定时间
+_tries = { 'exact': 1, 'seed': 2, 'model': 5, 'ladder': 14 } # 不同起点的预估尝试次数
+
+@dataclass
+class Issue:
+    index: int # 目标下标
+    level: Literal['error', 'warning']
+    message: str
+
+@dataclass
+class Feasibility:
+    issues: list[Issue] = field(default_factory=list)
+    duration: float = 0.0 # 预估耗时 (s)
+
+    @property
+    def errors(self):
+        return [i for i in self.issues if i.level == 'error']
+
+    @property
+    def warnings(self):
+        return [i for i in self.issues if i.level == 'warning']
+
+    def report(self):
+        lines = [f'目标{i.index + 1}: {i.message}' for i in self.issues]
+        lines.append(f'预计耗时 {self.duration / 60:.1f} 分钟')
+        return '\n'.join(lines)
+
+def _check_common(result: Feasibility, index: int, Vce: float, Ic: float, Vceo: float, Vcbo: float, Vebo: float):
+    error = lambda msg: result.issues.append(Issue(index, 'error', msg))
+    if Vce <= 0 or Ic <= 0:
+        error(f'Vce={Vce}V, Ic={Ic}A 无效')
+        return False
+    if Vce > Vceo: error(f'Vce={Vce}V 超过 Vceo={Vceo}V')
+    # Vc 阶段 Ve 为零, Vcb 接近 Vce
+    if Vce - _Vbe > Vcbo: error(f'Vce={Vce}V 对应的 Vcb 超过 Vcbo={Vcbo}V')
+    if Vebo < _Vbe: result.issues.append(Issue(index, 'warning', f'Vebo={Vebo}V 小于 Vbe, 测试时可能误判超限'))
+    # 与 DeviceWorker.setup_dmm_ranges 使用相同的量程
+    for name, volt in [('Vce', Vce), ('Vebo', Vebo), ('Vcbo', Vcbo)]:
+        try: volt_range(volt)
+        except Exception: error(f'{name}={volt}V 超过万用表最大量程')
+    try: curr_range(Ic)
+    except Exception: error(f'Ic={Ic}A 超过万用表最大量程')
+    return True
+
+def _check_resist(result: Feasibility, index: int, Vce: float, Ic: float, Rc: str, Re: str, Vc_max: float, Ve_max: float):
+    '''与 plan_resist 和搜索相同, 按 operating_point 的 Ve ≈ Vbe + Ic·Rc, Vc = Vce + Ve 检查电阻档位, 返回实际使用的 (Rc, Re)'''
+    if auto in (Rc, Re):
+        try:
+            planned_Rc, planned_Re = plan_resist(Vce, Ic, Vc_max, Ve_max, PowerCV.resolution)
+        except Exception as e:
+            result.issues.append(Issue(index, 'error', str(e)))
+            return None
+        Rc = planned_Rc if Rc == auto else Rc
+        Re = planned_Re if Re == auto else Re
+    for R in [Rc, Re]:
+        if R not in values.values():
+            result.issues.append(Issue(index, 'error', f'电阻档位 {R} 不存在'))
+            return None
+
+    Vc, Ve = operating_point(Vce, Ic, ohm_to_float(Rc), _Vbe)
+    if Ve > Ve_max: result.issues.append(Issue(index, 'error', f'Rc={Rc} 时需要 Ve≈{Ve:.2f}V, 超过 Ve 限值 {Ve_max}V'))
+    if Vc > Vc_max: result.issues.append(Issue(index, 'error', f'Rc={Rc} 时需要 Vc≈{Vc:.2f}V, 超过 Vc 限值 {Vc_max}V'))
+    # Ic 对 Ve 的灵敏度为 1/Rc, 电源一个分辨率步进引起的 Ic 变化超过判定范围时, Ic 无法调到目标
+    ohm = ohm_to_float(Rc)
+    step = PowerCV.resolution / ohm / Ic if ohm > 0 else math.inf
+    if step > _Ic_tolerance:
+        result.issues.append(Issue(index, 'warning', f'Rc={Rc} 时电源每步进 Ic 变化 {step:.1%}, 可能无法匹配 Ic'))
+    return Rc, Re
+
+def check_refer(arg: ReferArgument, cache=None, thermal: ThermalBudget | None = None):
+    '''
+    不连接仪器检查参考测试的参数: 电阻档位、电源限值、万用表量程和 Vceo/Vcbo/Vebo,
+    并按缓存的工作点和冷却模型估计耗时; cache 为 refer.cache.SolutionCache
+    '''
+    thermal = thermal or ThermalBudget()
+    result = Feasibility()
+    if not arg.targets:
+        result.issues.append(Issue(-1, 'error', '没有测试目标'))
+        return result
+
+    for index, target in enumerate(arg.targets):
+        Vce, Ic = abs(target.Vce), target.Ic
+        if not _check_common(result, index, Vce, Ic, arg.Vceo, arg.Vcbo, arg.Vebo): continue
+        resists = _check_resist(result, index, Vce, Ic, target.Rc, target.Re, arg.Vc_max, arg.Ve_max)
+
+        seed = None
+        if cache is not None and resists is not None:
+            Rc, Re = resists
+            seed = cache.lookup(arg.name, arg.type, Vce, Ic, Rc, Re, ohm_to_float(Rc))
+        tries = _tries['exact' if seed and seed.exact else 'seed' if seed else arg.search]
+        Vc_delay = seed.Vc_delay if seed else _settle_time
+        Ve_delay = seed.Ve_delay if seed else _settle_time
+        output = arg.duration + Ve_delay
+        cooldown = thermal.estimate(Vce * Ic * output)
+        result.duration += tries * (Vc_delay + output + _tail_time + cooldown)
+
+    return result
+
+def check_exec(arg: ExecArgument, thermal: ThermalBudget | None = None):
+    '''不连接仪器检查持续测试的参数, 并估计耗时'''
+    thermal = thermal or ThermalBudget()
+    result = Feasibility()
+    for index, item in enumerate(arg.items):
+        Vce, Ic = abs(item.Vce), item.Ic
+        if not _check_common(result, index, Vce, Ic, arg.Vceo, arg.Vcbo, arg.Vebo): continue
+        for R in [item.Rc, item.Re]:
+            if R not in values.values():
+                result.issues.append(Issue(index, 'error', f'电阻档位 {R} 不存在'))
+        if item.Vc < 0 or item.Ve < 0:
+            result.issues.append(Issue(index, 'error', f'Vc={item.Vc}V, Ve={item.Ve}V 无效'))
+        output = item.duration + item.Ve_delay
+        result.duration += _settle_time + output + _tail_time + thermal.estimate(Vce * Ic * output)
+    return result
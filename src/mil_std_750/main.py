@@ -15,12 +15,17 @@ from .device import DevicePanel
 from .worker import Worker
 from .scope import Scope
 from .dmm import plc_to_rate
-from . import global_logger
+from . import global_logger, config_dir
 
 from .refer.task import ReferRunner
+from .exec.task import ExecRunner
+from .refer.cache import SolutionCache
+from .feasibility import Feasibility, check_refer, check_exec
+from .device.calibrate import CalibrationRunner
 from .worker.common import Context
+from .worker.loop import LoopThread
 
-_config_dir = Path.home() / '.mil-std-750'
+_config_dir = config_dir
 
 _log = logging.getLogger(__name__)
 _config = _config_dir / 'config.json'
@@ -31,7 +36,7 @@ def debugger_is_active() -> bool:
 
 class _Common(Protocol):
     def update_running_state(self, running: bool): ...
-    def start_target(self): ...
+    def start_target(self, socket: int = 0): ...
     def set_disabled(self, disabled: bool): ...
     
 class UiHandler(logging.Handler):
@@ -67,6 +72,9 @@ class DebugThread(QThread):
             debugpy.debug_this_thread()
         return super().run()
 
+class DebugLoopThread(DebugThread, LoopThread):
+    pass
+
 class MainWindow(QtWidgets.QMainWindow):
     logged = Signal(str)
 
@@ -74,13 +82,15 @@ class MainWindow(QtWidgets.QMainWindow):
         super().__init__()
         self.setWindowTitle('晶体管安全工作区测试平台')
     
-        self.io_thread = DebugThread(self)
+        # IO 线程一直运行 asyncio 事件循环, 测试以 future 的形式提交
+        self.io_thread = DebugLoopThread(self)
+        self.context = Context(self.io_thread)
+        self.context.moveToThread(self.io_thread)
 
+        # 旧的 Worker 在协程里嵌套 run_until_complete, 单独占用一个线程, 不阻塞 IO 线程
+        self.legacy_thread = DebugThread(self)
         self.worker = Worker()
-        self.worker.moveToThread(self.io_thread)
-
-        self.context = Context()
-        self.context.moveToThread(self.io_thread)
+        self.worker.moveToThread(self.legacy_thread)
 
         self.tab = QtWidgets.QTabWidget(self)
         self.refer = ReferPanel(self.tab)
@@ -95,12 +105,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setCentralWidget(self.tab)
 
         self.refer.startRequested.connect(self.start_refer)
+        self.refer.resumeRequested.connect(lambda: self.start_refer(resume=True))
         self.refer.abortRequested.connect(self.abort)
         self.refer.closed.connect(self.save)
 
         self.exec.startRequested.connect(self.start_exec)
         self.exec.abortRequested.connect(self.abort)
 
+        self.devices.calibrateRequested.connect(self.start_calibration)
+
         self.worker.stateChanged.connect(self.update_running_state)
         self.worker.targetStarted.connect(self.start_target)
         self.worker.message.connect(self.message)
@@ -112,8 +125,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self.worker.referTested.connect(self.add_refer)
         self.worker.referComplete.connect(self.exec.receive_refer_all_results)
 
-        self.worker.execTested.connect(self.receive_exec)
-        self.worker.execComplete.connect(self.exec.receive_exec_all_results)
         # self.context.plots.connect(self.plot)
 
         self.common: _Common | None = None
@@ -185,49 +196,86 @@ class MainWindow(QtWidgets.QMainWindow):
     def __enter__(self):
         self.load()
         self.io_thread.start()
+        self.legacy_thread.start()
         self.show()
         return self
 
     def __exit__(self, *exception):
-        self.io_thread.quit()
-        self.io_thread.wait()
+        self.io_thread.stop()
+        self.legacy_thread.quit()
+        self.legacy_thread.wait()
         self.save()
 
-    def start_refer(self):
-        self.common = self.refer
-        self.refer.restart()
+    def confirm_feasibility(self, result: Feasibility, common: _Common):
+        '''连接仪器前检查参数, 有不可能完成的目标时由操作员决定是否继续'''
+        for issue in result.issues:
+            log = _log.error if issue.level == 'error' else _log.warning
+            log(f'[feasibility] 目标{issue.index + 1}: {issue.message}')
+        _log.info(f'[feasibility] 预计耗时 {result.duration:.0f}s')
+        if not result.errors: return True
+
+        ret = QtWidgets.QMessageBox.warning(
+            self, '参数检查', f'{result.report()}\n\n部分目标无法完成，是否仍然开始测试?',
+            QtWidgets.QMessageBox.StandardButton.Yes, QtWidgets.QMessageBox.StandardButton.No)
+        if ret == QtWidgets.QMessageBox.StandardButton.Yes: return True
+        common.update_running_state(False)
+        return False
+
+    def start_refer(self, resume: bool = False):
         arg = self.refer.get_arguments()
         dev = self.devices.get_devices()
+        if not self.confirm_feasibility(check_refer(arg, SolutionCache.load(dev.fake)), self.refer): return
+        self.common = self.refer
+        self.refer.restart()
 
         def build_runner(context: Context):
-            runner = ReferRunner(arg, context)
+            runner = ReferRunner(arg, context, resume)
             runner.referTested.connect(self.add_refer)
             runner.referComplete.connect(self.exec.receive_refer_results)
             return runner
 
-        def run():
-            # self.worker.start(arg, dev)
-            self.context.start(arg.type, dev, build_runner)
-            
-        # QTimer.singleShot(0, self.worker, run)
-        QTimer.singleShot(0, self.context, run)
+        # QTimer.singleShot(0, self.worker, lambda: self.worker.start(arg, dev))
+        self.context.start(arg.type, dev, build_runner)
 
     def start_exec(self):
+        arg = self.exec.get_arguments()
+        dev = self.devices.get_devices()
+        if not self.confirm_feasibility(check_exec(arg), self.exec): return
         self.common = self.exec
         self.exec.restart()
-        arg = self.exec.get_arguments()
+
+        def build_runner(context: Context):
+            runner = ExecRunner(arg, context)
+            runner.execTested.connect(self.receive_exec)
+            runner.execComplete.connect(self.exec.receive_exec_all_results)
+            return runner
+
+        self.context.start(arg.type, dev, build_runner)
+
+    def start_calibration(self):
+        self.common = None
         dev = self.devices.get_devices()
 
-        def run(): self.worker.start(arg, dev)
-        QTimer.singleShot(0, self.worker, run)
+        def build_runner(context: Context):
+            runner = CalibrationRunner(context)
+            # 连接到 MainWindow 的方法, 在 GUI 线程设置校准表之后再保存配置
+            runner.calibrated.connect(self.set_resist_calibration)
+            return runner
+
+        self.context.start('NPN', dev, build_runner)
+
+    def set_resist_calibration(self, table: ResistCalibration):
+        self.devices.set_resist_calibration(table)
+        self.save()
 
-    def start_target(self):
+    def start_target(self, Vce: float = 0.0, Ic: float = 0.0, socket: int = 0):
         if self.common:
-            self.common.start_target()
+            self.common.start_target(socket)
 
-    def add_refer(self, result: ReferResult):
+    def add_refer(self, result: ReferTrySummary | ReferResult):
         self.refer.add_refer(result)
-        self.refer.add_test_point(abs(result.Vce), result.Ic)
+        socket = result.socket if isinstance(result, ReferTrySummary) else 0
+        self.refer.add_test_point(abs(result.Vce), result.Ic, socket)
         if 0:
             fig, (axv, axi) = plt.subplots(2, 1)
             axv.plot(result.all_vce, label='Vce')
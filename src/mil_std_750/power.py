@@ -33,6 +33,8 @@ class _Output:
             pass
 
 class Power:
+    resolution = 0.001 # 电压设定分辨率 (V)
+
     def __init__(self, ip, fake: bool = False):
         self._fake = fake
         if fake: return
@@ -1,11 +1,13 @@
-import logging, math
+import logging
 from PySide6 import QtGui, QtWidgets
 from PySide6.QtCore import Signal, Slot, Qt
 from PySide6.QtWidgets import QWidget, QDialog, QMessageBox
 from ..types import *
 from ..chart import Chart
-from ..resist import values
+from ..resist import values, plan_resist, auto
+from ..power import PowerCV
 from .args_ui import Ui_ArgumentPanel
+from .sweep import soa_targets
 
 _log = logging.getLogger(__name__)
 
@@ -27,19 +29,21 @@ class Target(QWidget):
         self.Ic.editingFinished.connect(self.changed)
         layout.addWidget(self.Ic, 1)
 
-        Rs = ['0', '1', '10', '100', '1k', '10k', '100k']
-
         self.Rc = QtWidgets.QComboBox(self)
-        self.Rc.addItems(Rs)
         self.Rc.activated.connect(self.changed)
         layout.addWidget(self.Rc, 1)
         
         self.Re = QtWidgets.QComboBox(self)
-        self.Re.addItems(Rs)
         self.Re.activated.connect(self.changed)
         layout.addWidget(self.Re, 1)
 
+        for box in [self.Rc, self.Re]:
+            box.addItem('自动', auto)
+            for r in values.values(): box.addItem(r, r)
+
+        self.limits = (200.0, 200.0) # Vc_max, Ve_max
         self.Rx = QtWidgets.QLabel(self)
+        self.Vce.valueChanged.connect(self.update_rx)
         self.Ic.valueChanged.connect(self.update_rx)
         layout.addWidget(self.Rx, 1)
         
@@ -48,34 +52,89 @@ class Target(QWidget):
         self.remove.setFixedSize(30, 30)
         layout.addWidget(self.remove)
 
-    def update_rx(self, ic: float):
+    def set_limits(self, Vc_max: float, Ve_max: float):
+        self.limits = (Vc_max, Ve_max)
+        self.update_rx()
+
+    def update_rx(self, *args):
         Vce = self.Vce.value()
         ic = self.Ic.value() * 1e-3
         if Vce <= 0 or ic <= 0: return
 
-        if Vce < 15:
-            minR, maxR = 1 / ic,  30 / ic
-        else:
-            minR, maxR = 3 / ic,  30 / ic
-
-        exp = int(math.ceil(math.log10(minR)))
-        value = int(10 ** exp) if exp >= 0 else 0
-        rx = values.get(value, '')
+        try:
+            Rc, Re = plan_resist(Vce, ic, *self.limits, PowerCV.resolution)
+            rx = Rc if Rc == Re else f'{Rc}/{Re}'
+        except Exception:
+            rx = '超限'
         self.Rx.setText(rx)
     
     def save(self):
         return ReferTarget(
             self.Vce.value(), 
             self.Ic.value() * 1e-3,
-            self.Rc.currentText(),
-            self.Re.currentText(),
+            self.Rc.currentData(),
+            self.Re.currentData(),
         )
     
     def load(self, data: ReferTarget):
         self.Vce.setValue(data.Vce)
         self.Ic.setValue(data.Ic * 1000)
-        self.Rc.setCurrentText(data.Rc)
-        self.Re.setCurrentText(data.Re)
+        self.Rc.setCurrentIndex(max(self.Rc.findData(data.Rc), 0))
+        self.Re.setCurrentIndex(max(self.Re.findData(data.Re), 0))
+
+class SweepDialog(QDialog):
+    '''输入 SOA 边界折点, 沿边界生成测试目标'''
+    def __init__(self, soa: list[tuple[float, float]], derating: float, parent: QWidget | None = None):
+        super().__init__(parent)
+        self.setWindowTitle('SOA 边界扫描')
+        layout = QtWidgets.QFormLayout(self)
+
+        self.curve = QtWidgets.QPlainTextEdit(self)
+        self.curve.setPlaceholderText('每行一个折点: Vce/V, Ic/mA')
+        self.curve.setPlainText('\n'.join(f'{v:g}, {i * 1000:g}' for v, i in soa))
+        layout.addRow('边界折点', self.curve)
+
+        self.derating = QtWidgets.QDoubleSpinBox(self)
+        self.derating.setDecimals(2)
+        self.derating.setRange(0.05, 1.0)
+        self.derating.setSingleStep(0.05)
+        self.derating.setValue(derating)
+        layout.addRow('降额系数', self.derating)
+
+        self.points = QtWidgets.QSpinBox(self)
+        self.points.setRange(2, 50)
+        self.points.setValue(10)
+        layout.addRow('目标点数', self.points)
+
+        self.replace = QtWidgets.QCheckBox('替换已有的测试目标', self)
+        self.replace.setChecked(True)
+        layout.addRow('', self.replace)
+
+        buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.StandardButton.Ok | QtWidgets.QDialogButtonBox.StandardButton.Cancel, self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def soa(self):
+        curve: list[tuple[float, float]] = []
+        for line in self.curve.toPlainText().splitlines():
+            line = line.replace('，', ',').strip()
+            if not line: continue
+            v, i = (float(x) for x in line.split(','))
+            curve.append((v, i * 1e-3))
+        return curve
+
+    def accept(self):
+        try:
+            curve = self.soa()
+        except ValueError:
+            QMessageBox.warning(self, '参数错误', '折点格式应为: Vce/V, Ic/mA')
+            return
+        if len(curve) < 2:
+            QMessageBox.warning(self, '参数错误', '至少需要两个边界折点')
+            return
+        return super().accept()
 
 class ArgumentPanel(QDialog):
     def __init__(self, names: set[str], parent: QWidget | None = None):
@@ -85,6 +144,8 @@ class ArgumentPanel(QDialog):
         self.names = names
         self.targets: list[Target] = []
         self.chart = Chart()
+        self.soa: list[tuple[float, float]] = []
+        self.derating = 0.8
 
         self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose, True)
         ui.setupUi(self)
@@ -103,6 +164,24 @@ class ArgumentPanel(QDialog):
         ui.stableTime.setSingleStep(0.100)
         ui.stableTime.setValue(10)
 
+        # 相对标准误差, 0 为不提前结束
+        ui.precision.setSuffix(' %')
+        ui.precision.setDecimals(3)
+        ui.precision.setRange(0, 10)
+        ui.precision.setSingleStep(0.01)
+        ui.precision.setSpecialValueText('不启用')
+        ui.precision.setValue(0)
+
+        ui.minDuration.setSuffix(' s')
+        ui.minDuration.setDecimals(3)
+        ui.minDuration.setMinimum(0.350)
+        ui.minDuration.setMaximum(100)
+        ui.minDuration.setSingleStep(0.100)
+        ui.minDuration.setValue(0.350)
+
+        ui.searchMode.addItem('模型求解', 'model')
+        ui.searchMode.addItem('步进搜索', 'ladder')
+
         volt_limit_boxes = [ui.maxVc, ui.maxVe, ui.Vceo, ui.Vebo, ui.Vcbo]
         for box in volt_limit_boxes:
             box.setSuffix(' V')
@@ -112,13 +191,18 @@ class ArgumentPanel(QDialog):
             box.setSingleStep(0.1)
             box.setValue(200)
 
+        for box in [ui.maxVc, ui.maxVe]:
+            box.valueChanged.connect(self.update_limits)
+
         ui.chartView.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
         ui.chartView.setChart(self.chart)
         ui.btnAdd.clicked.connect(self.add_target)
+        ui.btnSweep.clicked.connect(self.sweep_targets)
 
     @Slot()
     def add_target(self):
         target = Target()
+        target.set_limits(self.ui.maxVc.value(), self.ui.maxVe.value())
         target.changed.connect(self.update_targets)
         target.remove.clicked.connect(lambda: self.remove_target(target))
         self.ui.layoutTargets.addWidget(target)
@@ -131,6 +215,11 @@ class ArgumentPanel(QDialog):
         target.deleteLater()
         self.update_targets()
 
+    @Slot()
+    def update_limits(self):
+        for target in self.targets:
+            target.set_limits(self.ui.maxVc.value(), self.ui.maxVe.value())
+
     def get_targets(self):
         targets: list[ReferTarget] = []
         for target in self.targets:
@@ -138,6 +227,18 @@ class ArgumentPanel(QDialog):
         _log.debug(f'{targets = }')
         return targets
 
+    @Slot()
+    def sweep_targets(self):
+        dialog = SweepDialog(self.soa, self.derating, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted: return
+        self.soa, self.derating = dialog.soa(), dialog.derating.value()
+        if dialog.replace.isChecked():
+            for target in list(self.targets): self.remove_target(target)
+        for data in soa_targets(self.soa, self.derating, dialog.points.value()):
+            self.load_target(data)
+        self.chart.set_boundary(self.soa)
+        self.update_targets()
+
     def load_target(self, data: ReferTarget):
         target: Target = self.add_target()
         target.load(data)
@@ -162,12 +263,28 @@ class ArgumentPanel(QDialog):
             Vebo=self.ui.Vebo.value(),
             Vcbo=self.ui.Vcbo.value(),
             targets=[t.save() for t in self.targets],
+            search=self.ui.searchMode.currentData(),
+            precision=self.ui.precision.value() / 100,
+            min_duration=self.ui.minDuration.value(),
+            trim=self.ui.trim.isChecked(),
+            reorder=self.ui.reorder.isChecked(),
+            soa=self.soa,
+            derating=self.derating,
+            trace=self.ui.trace.isChecked(),
         )
 
     def load(self, data: ReferArgument):
         self.ui.name.setText(data.name)
         self.ui.duration.setValue(data.duration)
         self.ui.stableTime.setValue(data.stable_duration)
+        self.ui.searchMode.setCurrentIndex(max(self.ui.searchMode.findData(data.search), 0))
+        self.ui.precision.setValue(data.precision * 100)
+        self.ui.minDuration.setValue(data.min_duration)
+        self.ui.trim.setChecked(data.trim)
+        self.ui.reorder.setChecked(data.reorder)
+        self.ui.trace.setChecked(data.trace)
+        self.soa, self.derating = list(data.soa), data.derating
+        self.chart.set_boundary(self.soa)
         
         if data.type == 'NPN':
             self.ui.radioNPN.setChecked(True)
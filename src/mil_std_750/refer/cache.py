@@ -0,0 +1,96 @@
+import logging, json, math
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from ..types import ReferTargetResult
+from .. import config_dir
+
+_log = logging.getLogger(__name__)
+
+@dataclass
+class Solution:
+    name: str
+    type: str
+    Vce: float # 目标 Vce (正值)
+    Ic: float
+    Rc: str
+    Re: str
+
+    Vc: float
+    Ve: float
+    Vc_delay: float
+    Ve_delay: float
+
+    def key(self):
+        return (self.name, self.type, self.Vce, self.Ic, self.Rc, self.Re)
+
+@dataclass
+class Seed:
+    Vc: float
+    Ve: float
+    Vc_delay: float
+    Ve_delay: float
+    exact: bool
+
+def shift(Vc: float, Ve: float, Vce: float, Ic: float, Rc_ohm: float,
+          new_Vce: float, new_Ic: float, new_Rc_ohm: float):
+    '''保留已知工作点的 Vbe 和 Vc - Ve - Vce 偏移, 按电路方程平移到新目标, 返回 (Vc, Ve)'''
+    Vbe = Ve - Ic * Rc_ohm
+    offset = Vc - Ve - Vce
+    new_Ve = max(Vbe + new_Ic * new_Rc_ohm, 0.0)
+    return new_Ve + new_Vce + offset, new_Ve
+
+class SolutionCache:
+    '''
+    已收敛的工作点: 同一型号 (参数名称) 再次测试相同或相近的目标时,
+    以缓存的 Vc/Ve 作为搜索起点, 省去从零开始的步进搜索
+    '''
+    def __init__(self, path: Path | None = None):
+        self.path = path
+        self.solutions: dict[tuple, Solution] = {}
+
+    @classmethod
+    def load(cls, fake: bool = False):
+        # 模拟仪器的结果只在本次测试内复用, 不写入文件
+        cache = cls(None if fake else config_dir / 'solutions.json')
+        if cache.path is None or not cache.path.exists(): return cache
+        try:
+            with open(cache.path, 'r', encoding='utf-8') as f:
+                for data in json.load(f):
+                    solution = Solution(**data)
+                    cache.solutions[solution.key()] = solution
+        except Exception:
+            _log.exception(f'[cache] 无法读取 {cache.path}, 忽略已缓存的工作点')
+            cache.solutions.clear()
+        return cache
+
+    def save(self):
+        if self.path is None: return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump([asdict(s) for s in self.solutions.values()], f, ensure_ascii=False, indent=4)
+
+    def store(self, name: str, type: str, result: ReferTargetResult):
+        solution = Solution(
+            name=name, type=type,
+            Vce=abs(result.target_Vce), Ic=result.target_Ic,
+            Rc=result.Rc, Re=result.Re,
+            Vc=result.Vc, Ve=result.Ve,
+            Vc_delay=result.Vc_delay, Ve_delay=result.Ve_delay,
+        )
+        self.solutions[solution.key()] = solution
+        self.save()
+
+    def lookup(self, name: str, type: str, Vce: float, Ic: float, Rc: str, Re: str, Rc_ohm: float):
+        Vce = abs(Vce)
+        if (exact := self.solutions.get((name, type, Vce, Ic, Rc, Re))) is not None:
+            return Seed(exact.Vc, exact.Ve, exact.Vc_delay, exact.Ve_delay, True)
+
+        candidates = [s for s in self.solutions.values() if (s.name, s.type, s.Rc, s.Re) == (name, type, Rc, Re)]
+        if not candidates: return None
+
+        # 按相对距离取最近的工作点, 保留其 Vbe 和 Vc - Ve - Vce 偏移, 按电路方程平移到新目标
+        def distance(s: Solution):
+            return math.hypot((s.Vce - Vce) / max(Vce, 1.0), (s.Ic - Ic) / max(Ic, 1e-6))
+        near = min(candidates, key=distance)
+        Vc, Ve = shift(near.Vc, near.Ve, near.Vce, near.Ic, Rc_ohm, Vce, Ic, Rc_ohm)
+        return Seed(Vc, Ve, near.Vc_delay, near.Ve_delay, False)
@@ -0,0 +1,85 @@
+import logging, json, re, time, os
+from dataclasses import asdict
+from ..types import ReferArgument, ReferTargetResult
+from .. import config_dir
+
+_log = logging.getLogger(__name__)
+
+def _path(name: str):
+    return config_dir / 'checkpoints' / (re.sub(r'[\\/:*?"<>|]', '_', name) + '.json')
+
+class Checkpoint:
+    '''
+    参考测试的断点: 每完成一个目标就写入文件, 测试中断后以相同的参数从第一个未完成的目标继续;
+    只保存结果的数值, 不保存采样数据 (measurements)
+    '''
+    def __init__(self, arg: ReferArgument, fake: bool, session: str | None = None):
+        self.arg = arg
+        self.fake = fake
+        self.session = session or time.strftime('%Y%m%d-%H%M%S')
+        self.results: dict[int, dict[int, ReferTargetResult]] = {} # 工位 -> 目标下标 -> 结果
+        self.path = _path(arg.name)
+
+    @staticmethod
+    def exists(name: str):
+        return _path(name).exists()
+
+    @classmethod
+    def open(cls, arg: ReferArgument, fake: bool, resume: bool = False):
+        '''
+        resume 时读取同一参数的断点, 参数已修改或断点无效时重新开始;
+        重新开始时立即删除旧断点, 第一个目标完成前中断也不会在下次继续时读到上一次的结果
+        '''
+        checkpoint = cls(arg, fake)
+        if not resume:
+            checkpoint.clear()
+            return checkpoint
+        if not checkpoint.path.exists():
+            _log.warning(f'[checkpoint] 没有 {arg.name} 的断点, 从头开始测试')
+            return checkpoint
+        try:
+            with open(checkpoint.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data['argument'] != json.loads(json.dumps(asdict(arg))) or data['fake'] != fake:
+                _log.warning(f'[checkpoint] {arg.name} 的参数或仪器已修改, 从头开始测试')
+                checkpoint.clear()
+                return checkpoint
+            checkpoint.session = data['session']
+            for socket, results in data['results'].items():
+                checkpoint.results[int(socket)] = {
+                    int(i): ReferTargetResult(**result) for i, result in results.items()}
+        except Exception:
+            _log.exception(f'[checkpoint] 无法读取 {checkpoint.path}, 从头开始测试')
+            checkpoint.results.clear()
+            checkpoint.clear()
+            return checkpoint
+        done = sum(len(r) for r in checkpoint.results.values())
+        _log.info(f'[checkpoint] 继续测试 {checkpoint.session}, 已完成 {done} 个目标')
+        return checkpoint
+
+    def done(self, socket: int):
+        return self.results.get(socket, {})
+
+    def add(self, socket: int, index: int, result: ReferTargetResult):
+        self.results.setdefault(socket, {})[index] = result
+        self.save()
+
+    def save(self):
+        data = dict(
+            argument=asdict(self.arg),
+            fake=self.fake,
+            session=self.session,
+            results={
+                socket: {i: {**asdict(r), 'measurements': {}} for i, r in results.items()}
+                for socket, results in self.results.items()
+            },
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换, 写入中途断电也不会损坏已有的断点
+        temp = self.path.with_suffix('.tmp')
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(temp, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,76 @@
+import logging, itertools
+from dataclasses import dataclass
+from ..dmm import volt_range, curr_range
+from ..worker.thermal import ThermalBudget
+
+_log = logging.getLogger(__name__)
+
+# 切换耗时的估计值 (s)
+_relay_time = 0.050 # 电阻箱一个通道的继电器动作和稳定
+_range_time = 0.300 # 万用表切换一次量程
+_output_time = 2.0 # 一次尝试的典型施加功率时长, 用于估计冷却时间
+_exhaustive = 8 # 不超过该数量时穷举所有顺序
+
+@dataclass
+class Step:
+    Vce: float
+    Ic: float
+    Rc: str
+    Re: str
+
+    @property
+    def power(self):
+        return abs(self.Vce) * self.Ic
+
+def _range(fn, value):
+    try:
+        return fn(value)[0]
+    except Exception:
+        return None # 超量程的目标会在测试时报错, 这里不计入
+
+def switch_time(a: Step, b: Step):
+    '''从目标 a 切换到目标 b 需要的继电器和量程切换时间'''
+    t = _relay_time * ((a.Rc != b.Rc) + (a.Re != b.Re))
+    if _range(volt_range, a.Vce) != _range(volt_range, b.Vce): t += _range_time
+    if _range(curr_range, a.Ic) != _range(curr_range, b.Ic): t += 2 * _range_time # Ic, Ie 两块表
+    return t
+
+class _Costs:
+    '''
+    按顺序测试的额外耗时: 相邻目标之间的切换时间, 加上除最后一个目标外每个目标结束后的冷却时间;
+    冷却时间由功率估计, 功率大的目标放在后面时其冷却可以省去, 也让样品的热应力逐步增加
+    '''
+    def __init__(self, steps: list[Step], thermal: ThermalBudget):
+        self.steps = steps
+        self.switch = [[switch_time(a, b) for b in steps] for a in steps]
+        self.cooldown = [thermal.estimate(s.power * _output_time) for s in steps]
+
+    def __call__(self, order: list[int]):
+        return sum(self.switch[i][j] + self.cooldown[i] for i, j in itertools.pairwise(order))
+
+    def greedy(self, first: int):
+        order = [first]
+        rest = set(range(len(self.steps))) - {first}
+        while rest:
+            i = order[-1]
+            # 切换时间相同时先测功率小的
+            j = min(rest, key=lambda j: (self.switch[i][j], self.steps[j].power, j))
+            order.append(j)
+            rest.discard(j)
+        return order
+
+def plan_order(steps: list[Step], thermal: ThermalBudget | None = None):
+    '''返回 (测试顺序, 原顺序的额外耗时, 新顺序的额外耗时)'''
+    cost = _Costs(steps, thermal or ThermalBudget())
+    original = list(range(len(steps)))
+    if len(steps) < 2: return original, 0.0, 0.0
+
+    if len(steps) <= _exhaustive:
+        candidates = (list(p) for p in itertools.permutations(original))
+    else:
+        candidates = (cost.greedy(first) for first in original)
+    best = min(itertools.chain([original], candidates), key=cost)
+
+    before, after = cost(original), cost(best)
+    if after >= before: return original, before, before
+    return best, before, after
@@ -9,12 +9,14 @@ from ..types import *
 from ..chart import Chart
 from ..table_csv import export_csv
 from .args import ArgumentPanel
+from .checkpoint import Checkpoint
 from .panel_ui import Ui_ReferPanel
 
 _log = logging.getLogger(__name__)
 
 class ReferPanel(QtWidgets.QWidget):
     startRequested = Signal()
+    resumeRequested = Signal()
     abortRequested = Signal()
     closed = Signal()
 
@@ -113,12 +115,15 @@ class ReferPanel(QtWidgets.QWidget):
         menu = QtWidgets.QMenu(self)
         menu.addAction('编辑', lambda: self._try_edit(item))
         menu.addAction('删除', lambda: self._try_delete(item))
+        resume = menu.addAction('从断点继续', lambda: self._try_resume(item))
+        resume.setEnabled(self.ui.btnStart.isEnabled() and Checkpoint.exists(item.text()))
         menu.exec(self.ui.listArgs.mapToGlobal(point))
 
     def _set_current_args(self, item: QListWidgetItem):
         self.ui.listArgs.setCurrentItem(item)
         arg = self.args[id(item)]
         self.chart.set_targets([(t.Vce, t.Ic) for t in arg.targets])
+        self.chart.set_boundary(arg.soa)
 
     def _add_args(self, arg: ReferArgument, item: QListWidgetItem):
         xid = id(item)
@@ -167,6 +172,11 @@ class ReferPanel(QtWidgets.QWidget):
         panel.load(old_arg)
         panel.open()
 
+    def _try_resume(self, item: QListWidgetItem):
+        self._set_current_args(item)
+        self.ui.btnStart.setDisabled(True)
+        self.resumeRequested.emit()
+
     def _try_delete(self, item: QListWidgetItem):
         ret = QMessageBox.warning(
             self, '删除参数', f'是否删除 {item.text()}?', 
@@ -191,13 +201,13 @@ class ReferPanel(QtWidgets.QWidget):
     def restart(self):
         self.chart.restart()
 
-    def start_target(self):
-        self.chart.make_trace()
+    def start_target(self, socket: int = 0):
+        self.chart.make_trace(socket)
 
-    def add_test_point(self, Vce: float, Ic: float):
-        self.chart.add_test_point(Vce, Ic)
+    def add_test_point(self, Vce: float, Ic: float, socket: int = 0):
+        self.chart.add_test_point(Vce, Ic, socket)
 
-    def add_refer(self, data: ReferResult):
+    def add_refer(self, data: ReferTrySummary | ReferResult):
         tb = self.ui.table
         row = tb.rowCount()
         tb.insertRow(row)
@@ -0,0 +1,94 @@
+import logging
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+class InfeasibleError(Exception):
+    pass
+
+def _clamp(value: float, low: float, high: float):
+    return min(max(value, low), high)
+
+def trim_step(Vc: float, Ve: float, dVe: float, dVce: float, limit_ve: float, limit_vc: float,
+              Vc_max: float, Ve_max: float):
+    '''
+    闭环调节的一步: dVe 修正 Ic, dVce 修正 Vce (= Vc - Ve), 返回新的 (Vc, Ve);
+    先限制 dVe, 由限制后的 dVe 得到 dVc 再限制, dVc 受限时同步缩小 dVe, Vce 的变化不会超过 dVce
+    '''
+    dVe = _clamp(dVe, max(-limit_ve, -Ve), min(limit_ve, Ve_max - Ve))
+    dVc = _clamp(dVe + dVce, max(-limit_vc, -Vc), min(limit_vc, Vc_max - Vc))
+    if dVe > 0: dVe = _clamp(dVc - dVce, 0, dVe)
+    elif dVe < 0: dVe = _clamp(dVc - dVce, dVe, 0)
+    return Vc + dVc, Ve + dVe
+
+class BroydenSolver:
+    '''
+    用已尝试的点拟合 (Vc, Ve) -> (Vce, Ic) 的局部线性模型, 求解下一个尝试点;
+    雅可比矩阵以电路方程 Vce = Vc - Ve, Ic = (Ve - Vbe) / Rc 为初值, 每次尝试后做 Broyden 秩一修正
+    '''
+    def __init__(self, Vce: float, Ic: float, Rc: float, Vc_max: float, Ve_max: float,
+                 J: np.ndarray | None = None):
+        assert Rc > 0 or J is not None, f'Rc={Rc} 时无法由电路方程得到雅可比矩阵'
+        s = 1.0 if Vce >= 0 else -1.0 # PNP 的 Vce 为负
+        self.target = np.array([Vce, Ic])
+        self.scale = np.array([max(abs(Vce), 1.0), max(abs(Ic), 1e-6)])
+        # J 为相邻目标修正后的雅可比矩阵, 比电路方程更接近实际器件
+        self.J = np.array([[s, -s], [0.0, 1.0 / Rc]]) if J is None else np.array(J, dtype=float)
+        self.limits = np.array([Vc_max, Ve_max])
+        self.x: np.ndarray | None = None
+        self.y: np.ndarray | None = None
+
+    def error(self, Vce: float, Ic: float):
+        '''按目标值归一化后的最大偏差'''
+        return float(np.max(np.abs((np.array([Vce, Ic]) - self.target) / self.scale)))
+
+    def update(self, Vc: float, Ve: float, Vce: float, Ic: float):
+        x, y = np.array([Vc, Ve]), np.array([Vce, Ic])
+        if self.x is not None and self.y is not None:
+            dx, dy = x - self.x, y - self.y
+            norm = float(dx @ dx)
+            if norm > 1e-12:
+                self.J += np.outer(dy - self.J @ dx, dx) / norm
+                _log.debug(f'[solver] J = {self.J.tolist()}')
+        self.x, self.y = x, y
+
+    def propose(self, max_step: tuple[float, float], tolerance: float = 0.05) -> tuple[float, float]:
+        '''
+        雅可比矩阵奇异时抛出 np.linalg.LinAlgError; 设定值已在电源限值上、
+        Ic 仍偏离目标超过 tolerance 时抛出 InfeasibleError
+        '''
+        assert self.x is not None and self.y is not None, '尚未有尝试点'
+        residual = self.target - self.y
+        dx = self.limit_step(np.linalg.solve(self.J, residual), max_step)
+
+        # 任一设定值越限时整步按比例缩短, 保持 Vc, Ve 的调整比例, 不会只有 Vc 继续移动而把 Vce 推离目标
+        scale, blocked = self.step_scale(dx)
+        if scale <= 1e-6:
+            Ic_error = abs(residual[1]) / self.scale[1]
+            if Ic_error > tolerance or blocked.all():
+                Vc_max, Ve_max = self.limits
+                raise InfeasibleError(f'Vc=0~{Vc_max}V, Ve=0~{Ve_max}V 的范围内无法达到 Ic={self.target[1]}A '
+                                      f'(当前 Vc={self.x[0]:.2f}, Ve={self.x[1]:.2f}, Ic={self.y[1]:.4g})')
+            # Ic 已在判定范围内, 固定受限的设定值, 按归一化的最小二乘只调整另一个
+            free = ~blocked
+            dx = np.zeros(2)
+            dx[free] = np.linalg.lstsq((self.J / self.scale[:, None])[:, free], residual / self.scale, rcond=None)[0]
+            dx = self.limit_step(dx, max_step)
+            scale, _ = self.step_scale(dx)
+        Vc, Ve = self.x + dx * scale
+        return float(Vc), float(Ve)
+
+    @staticmethod
+    def limit_step(dx: np.ndarray, max_step: tuple[float, float]):
+        # 限制单步调整量, 模型偏差较大时不至于一步跳到很远的位置
+        ratio = max(float(np.max(np.abs(dx) / np.array(max_step))), 1.0)
+        return dx / ratio
+
+    def step_scale(self, dx: np.ndarray):
+        '''x + dx * scale 保持在 [0, limits] 内的最大 scale (不超过 1), 以及已经没有余量的分量'''
+        assert self.x is not None
+        upper = np.maximum(self.limits - self.x, 0.0)
+        lower = np.minimum(-self.x, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            room = np.where(dx > 0, upper / dx, np.where(dx < 0, lower / dx, np.inf))
+        return float(min(np.min(room), 1.0)), room <= 1e-6
@@ -0,0 +1,33 @@
+import math
+from ..types import ReferTarget
+from ..resist import auto
+
+def soa_targets(curve: list[tuple[float, float]], derating: float, points: int):
+    '''
+    沿 SOA 边界生成测试目标: curve 为数据手册的折点 (Vce/V, Ic/A), 在对数坐标下按折线长度等距取 points 个点,
+    Ic 乘以降额系数; 相邻目标的工作点接近, 测试时以已收敛的相邻目标作为搜索起点
+    '''
+    curve = sorted((v, i) for v, i in curve if v > 0 and i > 0)
+    if not curve: return []
+    if len(curve) == 1 or points < 2:
+        v, i = curve[0]
+        return [ReferTarget(round(v, 2), round(i * derating, 5), auto, auto)]
+
+    logs = [(math.log10(v), math.log10(i)) for v, i in curve]
+    lengths = [0.0]
+    for (x0, y0), (x1, y1) in zip(logs, logs[1:]):
+        lengths.append(lengths[-1] + math.hypot(x1 - x0, y1 - y0))
+
+    targets: list[ReferTarget] = []
+    k = 0
+    for n in range(points):
+        s = lengths[-1] * n / (points - 1)
+        while k < len(lengths) - 2 and lengths[k + 1] < s: k += 1
+        span = lengths[k + 1] - lengths[k]
+        t = (s - lengths[k]) / span if span > 0 else 0.0
+        x = logs[k][0] + (logs[k + 1][0] - logs[k][0]) * t
+        y = logs[k][1] + (logs[k + 1][1] - logs[k][1]) * t
+        target = ReferTarget(round(10 ** x, 2), round(10 ** y * derating, 5), auto, auto)
+        if not targets or (target.Vce, target.Ic) != (targets[-1].Vce, targets[-1].Ic):
+            targets.append(target)
+    return targets
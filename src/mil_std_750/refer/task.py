@@ -1,37 +1,138 @@
-import logging, asyncio, random
+import logging, asyncio, dataclasses, time, math
 import numpy as np
 import matplotlib.pyplot as plt
 from PySide6.QtCore import QObject, Signal
 from ..types import ReferArgument, ReferTarget, ReferTargetResult, ReferResults, Measurement
-from ..worker.common import TargetArgument, EventPoint, DeviceWorker, Context
-from ..resist import ohm_to_float
+from ..worker.common import TargetArgument, EventPoint, DeviceWorker, ChannelStore, Context, Cancellation, fake_chunks, vc_settled
+from ..worker.safety import BreakdownGuard
+from ..worker.window import SlidingWindow, SettlePredictor, Prediction, BatchMeans
+from ..resist import plan_resist, operating_point, auto
+from ..power import PowerCV
+from .solver import BroydenSolver, trim_step
+from .cache import SolutionCache, Seed, shift
+from .order import Step, plan_order
+from .checkpoint import Checkpoint
+from .trace import TraceWriter
 
 _log = logging.getLogger(__name__)
 
 class ReferRunner(QObject):
-    referTested = Signal(ReferTargetResult)
-    referComplete = Signal(ReferResults)
+    referTested = Signal(object) # ReferTrySummary
+    referComplete = Signal(list) # list[ReferResults], 每个工位一项, 整次测试只发送一次
 
-    def __init__(self, arg: ReferArgument, context: Context):
+    def __init__(self, arg: ReferArgument, context: Context, resume: bool = False, raw_tries: bool = False):
         super().__init__(context)
         self.context = context
         self.arg = arg
+        self.resume = resume # 从上次中断的断点继续
+        self.raw_tries = raw_tries # 每次尝试都附带采样数据, 默认只有 referComplete 的最终结果带有
     
     async def run(self, device: DeviceWorker):
         self.device = device
-        all_results = ReferResults(self.arg, [])
-        for target in self.arg.targets:
-            result = await self.run_target(target)
-            all_results.results.append(result)
-        self.referComplete.emit(all_results)
-        self.context.message.emit('测试成功，请在数据表查看数据，在持续测试界面进一步测试')
+        self.cache = SolutionCache.load(device.fake)
+        self.checkpoint = Checkpoint.open(self.arg, device.fake, self.resume)
+        # 各工位本次已收敛的目标和模型搜索修正后的雅可比矩阵, 作为相邻目标的搜索起点
+        self.converged: dict[int, list[tuple[ReferTargetResult, np.ndarray | None]]] = {}
+        self.order = self.plan_order()
+        self.traces: dict[int, TraceWriter] = {}
+        try:
+            await self.run_sockets()
+        finally:
+            for trace in self.traces.values(): trace.close()
+
+    def trace(self, socket: int):
+        '''各工位的搜索交替进行, 分别记录'''
+        if not self.arg.trace: return None
+        if socket not in self.traces:
+            name = self.arg.name if not self.device.fixture.multiple else f'{self.arg.name}-工位{socket + 1}'
+            self.traces[socket] = TraceWriter.create(name)
+        return self.traces[socket]
+
+    async def run_sockets(self):
+        # 各工位完成或中断时的结果, 结束时按工位顺序一起发送
+        self.completed: dict[int, ReferResults] = {}
+        try:
+            await self.run_fixture()
+        finally:
+            if self.completed:
+                self.referComplete.emit([self.completed[s] for s in sorted(self.completed)])
+
+    async def run_fixture(self):
+        fixture = self.device.fixture
+        if not fixture.multiple:
+            await self.run_socket(0)
+            self.checkpoint.clear()
+            self.context.message.emit('测试成功，请在数据表查看数据，在持续测试界面进一步测试')
+            return
+
+        # 多工位: 各工位的搜索并行, 由 fixture 交替占用仪器, 一个工位冷却时测试另一个工位
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(self.try_socket(s)) for s in range(fixture.sockets)]
+        failed = sum(1 for task in tasks if task.result() is None)
+        if failed:
+            self.context.message.emit(f'{failed} 个工位测试失败，请在运行日志查看错误, 可从断点继续测试')
+        else:
+            self.checkpoint.clear()
+            self.context.message.emit('测试成功，请在数据表查看数据，在持续测试界面进一步测试')
+
+    async def try_socket(self, socket: int):
+        try:
+            return await self.run_socket(socket)
+        except Cancellation:
+            raise
+        except Exception:
+            _log.exception(f'[工位{socket + 1}] 测试时发生错误')
+            return None
+
+    async def run_socket(self, socket: int):
+        arg = self.arg
+        if self.device.fixture.multiple:
+            arg = dataclasses.replace(arg, name=f'{arg.name}-工位{socket + 1}')
+        # 按规划的顺序测试, 结果仍按参数中的目标顺序排列
+        results = dict(self.checkpoint.done(socket))
+        for i, result in sorted(results.items()):
+            self.referTested.emit(result.summary(socket=socket))
+            self.converged.setdefault(socket, []).append((result, None))
+        try:
+            for i in self.order:
+                if i in results: continue
+                results[i] = await self.run_target(self.arg.targets[i], socket)
+                self.checkpoint.add(socket, i, results[i])
+        except BaseException:
+            # 中断时仍把已完成的目标交给持续测试, 完整结果可从断点继续测试得到
+            if results:
+                _log.warning(f'[checkpoint] 测试中断, 已完成 {len(results)}/{len(self.arg.targets)} 个目标')
+                partial = dataclasses.replace(arg, name=f'{arg.name}(未完成)')
+                self.completed[socket] = ReferResults(partial, [results[i] for i in sorted(results)], socket)
+            raise
+        self.completed[socket] = ReferResults(arg, [results[i] for i in range(len(self.arg.targets))], socket)
+        return self.completed[socket]
+
+    def plan_order(self):
+        targets = self.arg.targets
+        if not self.arg.reorder: return list(range(len(targets)))
+        steps = [Step(t.Vce, t.Ic, *self.plan_resists(t, log=False)) for t in targets]
+        order, before, after = plan_order(steps, self.device.fixture.thermal)
+        if before > after:
+            _log.info(f'[plan] 调整测试顺序为 {[i + 1 for i in order]}, 预计节省 {before - after:.1f}s')
+        return order
     
-    async def run_target(self, target: ReferTarget) -> ReferTargetResult:
+    def plan_resists(self, target: ReferTarget, log: bool = True):
+        if auto not in (target.Rc, target.Re): return target.Rc, target.Re
+        planned_Rc, planned_Re = plan_resist(
+            target.Vce, target.Ic, self.arg.Vc_max, self.arg.Ve_max, PowerCV.resolution)
+        Rc = planned_Rc if target.Rc == auto else target.Rc
+        Re = planned_Re if target.Re == auto else target.Re
+        if log: _log.info(f'[plan] Vce={target.Vce}V, Ic={target.Ic}A 自动选择电阻 Rc={Rc}, Re={Re}')
+        return Rc, Re
+
+    async def run_target(self, target: ReferTarget, socket: int = 0) -> ReferTargetResult:
+        Rc, Re = self.plan_resists(target)
         target_arg = TargetArgument(
             Vce=target.Vce if self.arg.type == 'NPN' else -target.Vce,
             Ic=target.Ic,
-            Rc=target.Rc,
-            Re=target.Re,
+            Rc=Rc,
+            Re=Re,
             Vc_max=self.arg.Vc_max,
             Ve_max=self.arg.Ve_max,
             Vceo=self.arg.Vceo,
@@ -39,10 +140,28 @@ class ReferRunner(QObject):
             Vcbo=self.arg.Vcbo,
             output_time=self.arg.duration,
             total_time=self.arg.stable_duration,
+            precision=self.arg.precision,
+            min_output_time=min(self.arg.min_duration, self.arg.duration),
+            trim=self.arg.trim,
         )
-        self.context.targetStarted.emit(target.Vce, target.Ic)
-        searcher = Search(targ=target_arg, runner=self)
-        return await searcher.run()
+        self.context.targetStarted.emit(target.Vce, target.Ic, socket)
+        searcher = Search(targ=target_arg, runner=self, socket=socket)
+        if (trace := self.trace(socket)) is not None:
+            trace.write('target', targ=dataclasses.asdict(target_arg), type=self.arg.type,
+                        Rc=searcher.Rc, Re=searcher.Re, fake=self.device.fake)
+        result = await searcher.run()
+        self.cache.store(self.arg.name, self.arg.type, result)
+        self.converged.setdefault(socket, []).append((result, searcher.J))
+        return result
+
+    def neighbour(self, socket: int, Vce: float, Ic: float):
+        '''本次测试中对数坐标下最接近 (Vce, Ic) 的已收敛目标'''
+        converged = self.converged.get(socket)
+        if not converged: return None
+        def distance(item: tuple[ReferTargetResult, np.ndarray | None]):
+            result = item[0]
+            return math.hypot(math.log(abs(result.target_Vce) / abs(Vce)), math.log(result.target_Ic / Ic))
+        return min(converged, key=distance)
 
 def direction(value, target, range = 0.05):
     if value * target <= 0: return -1
@@ -53,33 +172,143 @@ def direction(value, target, range = 0.05):
     else:
         return 0
 
+# 模型搜索最多尝试的次数, 超过后从最优的尝试点改用步进搜索
+_model_tries = 8
+
+# 插值或平移得到的工作点只是估计, 第一次尝试的 Ve 取其 80%, 宁可 Ic 偏小也不要超调
+_seed_undershoot = 0.8
+
+# 闭环调节: 最多调节次数, 单次调节引起的 Ic/Vce 变化相对目标值的上限, 两次调节的最短间隔 (s)
+_trim_steps = 10
+_trim_ratio = 0.20
+_trim_interval = 0.250
+
 class Search:
-    def __init__(self, targ: TargetArgument, runner: ReferRunner):
+    def __init__(self, targ: TargetArgument, runner: ReferRunner, socket: int = 0):
         self.runner = runner
         self.targ = targ
-        self.Rc = ohm_to_float(targ.Rc)
+        self.socket = socket
+        self.Rc, self.Re = self.device.resist_ohms(targ.Rc, targ.Re)
 
         self.counter = 0
+        self._trace = runner.trace(socket)
 
-        self.Ve_hint = max(targ.Ic * self.Rc, 1)
+        self.Ve_hint = max(operating_point(targ.Vce, targ.Ic, self.Rc)[1], 1)
         self.Vc_hint = self.Ve_hint + targ.Vce
-        _log.debug(f'[search] {self.Vc_hint = }, {self.Ve_hint = }')
+        _log.debug(f'[search] {self.Rc = }, {self.Re = }, {self.Vc_hint = }, {self.Ve_hint = }')
+
+        arg = runner.arg
+        self.J: np.ndarray | None = None # 模型搜索修正后的雅可比矩阵, 供相邻目标使用
+        self.J_seed: np.ndarray | None = None
+        self.seed = runner.cache.lookup(arg.name, arg.type, targ.Vce, targ.Ic, targ.Rc, targ.Re, self.Rc)
+        if self.seed is not None:
+            seed = self.seed
+            _log.info(f'[cache] 使用{"缓存" if seed.exact else "插值"}的工作点 Vc={seed.Vc:.2f}, Ve={seed.Ve:.2f}, '
+                      f'上次 Vc 稳定耗时 {seed.Vc_delay:.3f}s, Ve 稳定耗时 {seed.Ve_delay:.3f}s')
+        if self.seed is None or not self.seed.exact:
+            self.chain_from_neighbour()
+
+    def chain_from_neighbour(self):
+        '''以本次已收敛的相邻目标为起点, 比跨测试的缓存插值更接近当前器件的状态'''
+        targ = self.targ
+        if abs(targ.Vce) <= 0 or targ.Ic <= 0: return
+        if (item := self.runner.neighbour(self.socket, targ.Vce, targ.Ic)) is None: return
+        near, J = item
+        # 任一电阻为 0 时 Ve 与 Ic 无关, 平移和雅可比换算都没有意义
+        if self.Rc <= 0 or near.Rc_value <= 0:
+            _log.debug(f'[chain] Rc 为 0, 不从相邻目标平移工作点')
+            return
+        # 平移得到的只是估计值 (exact=False), 第一次尝试由 seed_point 按 _seed_undershoot 降低 Ve
+        Vc, Ve = shift(near.Vc, near.Ve, abs(near.Vce), near.Ic, near.Rc_value, abs(targ.Vce), targ.Ic, self.Rc)
+        self.seed = Seed(Vc, Ve, near.Vc_delay, near.Ve_delay, False)
+        if J is not None:
+            # Ic 对 Ve 的灵敏度约为 1/Rc, 按两个目标的电阻换算
+            self.J_seed = J * np.array([[1.0], [near.Rc_value / self.Rc]])
+        _log.info(f'[chain] 从相邻目标 Vce={near.target_Vce}V, Ic={near.target_Ic}A 平移得到工作点 '
+                  f'Vc={Vc:.2f}, Ve={Ve:.2f}')
 
     @property
     def device(self):
         return self.runner.device
 
-    async def run(self):
-        self.device.set_resist(self.targ.Rc, self.targ.Re)
+    def now(self):
+        return time.monotonic()
+
+    def record(self, kind: str, **data):
+        if self._trace is None: return
+        self._trace.write(kind, t=self.now() - self._t0, **data)
+
+    async def setup_rig(self):
+        await self.device.set_resist(self.targ.Rc, self.targ.Re)
 
         rate, limits = await self.device.setup_dmm_ranges(self.targ)
         assert rate > 0, '无法设置万用表采样率'
-        self._rate = rate
-        self._limits = limits
+        return rate, limits
+
+    @property
+    def rig_config(self):
+        return (self.targ.Rc, self.targ.Re, self.targ.Vce, self.targ.Ic, self.targ.total_time)
+
+    async def run(self):
+        # Rc 为 0 时电路方程中 Ic 对 Ve 的灵敏度 1/Rc 无定义, 使用阶梯搜索
+        if self.runner.arg.search == 'model' and self.Rc <= 0:
+            _log.warning(f'[search] Rc={self.targ.Rc} 时无法建立电路模型, 改用阶梯搜索')
+        elif self.runner.arg.search == 'model':
+            xresult, matched = await self.search_model()
+            if matched: return xresult
+            if xresult is not None:
+                return await self.search_vce_ic(xresult.Vc - xresult.Ve, xresult.Ve)
+
+        # 有缓存的工作点时跳过 Ve 为零的 Vce 步进搜索
+        if (seed := self.seed) is not None:
+            Vc, Ve = self.seed_point(seed)
+            return await self.search_vce_ic(Vc - Ve, Ve)
 
         dV = await self.search_vce_0(0., 0., 0., 0.)
         return await self.search_vce_ic(dV, self.Ve_hint * 0.6)
 
+    def seed_point(self, seed: Seed):
+        '''第一次尝试的 (Vc, Ve): 相同目标的缓存工作点直接使用, 其他的按 _seed_undershoot 降低 Ve, 保持 Vc - Ve'''
+        Ve = seed.Ve if seed.exact else seed.Ve * _seed_undershoot
+        Ve = min(max(Ve, 0), self.targ.Ve_max)
+        Vc = min(max(Ve + seed.Vc - seed.Ve, 0), self.targ.Vc_max)
+        if not seed.exact:
+            _log.info(f'[search] 估计的工作点 Ve={seed.Ve:.2f} 留出余量, 第一次尝试 Vc={Vc:.2f}, Ve={Ve:.2f}')
+        return Vc, Ve
+
+    async def search_model(self):
+        target = self.targ
+        solver = BroydenSolver(target.Vce, target.Ic, self.Rc, target.Vc_max, target.Ve_max, self.J_seed)
+        self.J = solver.J
+        max_step = (max(abs(target.Vce) * 0.5, 6.0), max(self.Ve_hint * 0.5, 1.0))
+
+        if (seed := self.seed) is not None:
+            Vc, Ve = self.seed_point(seed)
+        else:
+            # 第一个点的 Ve 取预估值的 60%, 宁可 Ic 偏小也不要超调
+            Ve = min(self.Ve_hint * 0.6, target.Ve_max)
+            Vc = min(Ve + abs(target.Vce), target.Vc_max)
+        best: ReferTargetResult | None = None
+        for i in range(_model_tries):
+            xresult = await self.try_with(Vc, Ve)
+            Vce, Ic = xresult.Vce, xresult.Ic
+            if direction(Vce, target.Vce) == 0 and direction(Ic, target.Ic) == 0:
+                _log.info(f'[model] 第 {i + 1} 次尝试匹配完成: Vc={xresult.Vc:.2f}, Ve={xresult.Ve:.2f}, Vce={Vce:.2f}, Ic={Ic:.4f}')
+                return xresult, True
+
+            if best is None or solver.error(Vce, Ic) < solver.error(best.Vce, best.Ic):
+                best = xresult
+            solver.update(xresult.Vc, xresult.Ve, Vce, Ic)
+            try:
+                Vc, Ve = solver.propose(max_step)
+            except np.linalg.LinAlgError:
+                _log.warning('[model] 模型矩阵奇异')
+                break
+            _log.debug(f'[model] Vce偏离目标 {Vce - target.Vce:.2f}V, Ic偏离目标 {Ic - target.Ic:.4f}A, 下一点 Vc={Vc:.2f}, Ve={Ve:.2f}')
+
+        _log.warning('[model] 模型搜索未收敛, 从最接近目标的尝试点改用步进搜索')
+        return best, False
+
     async def search_vce_0(self, Vc: float, Ve: float, Vce: float, Ic: float):
         target = self.targ
 
@@ -174,7 +403,7 @@ class Search:
             xresult = await self.try_with(Vc, Ve)
             Vce, Ic = xresult.Vce, xresult.Ic
 
-        _log.info(f'[search] 匹配完成: Vc={Vc:.2f}, Ve={Ve:.2f}, Vce={Vce:.2f}, Ic={Ic:.2f}')
+        _log.info(f'[search] 匹配完成: Vc={xresult.Vc:.2f}, Ve={xresult.Ve:.2f}, Vce={Vce:.2f}, Ic={Ic:.2f}')
         return xresult
 
     async def try_with(self, Vc: float, Ve: float):
@@ -188,19 +417,28 @@ class Search:
         if self.counter > 50:
             raise Exception('多次调整 Vc/Ve 也未能达到目标条件')
         
-        events = EventPoint(Vc=Vc, Ve=Ve)
+        events = EventPoint(Vc=Vc, Ve=Ve, trim=self.targ.trim)
         results: dict[Measurement, list[float]] = { 'Vce': [], 'Ic': [], 'Ie': [], 'Vbe': [], 'Vcb': [] }
         fp = None
+        self._t0 = self.now()
+        self._decided: set[str] = set()
 
-        await self.device._dmms.initiate()
         try:
-            async with asyncio.TaskGroup() as tg:
-                fp = tg.create_task(self.device.power_control(events, self.targ))
-                tg.create_task(self.acquire_all(results, events), name='acquire_all')
-                tg.create_task(self.total_timeout(events), name='total_timeout')
-
-            b, e = self.mapping(events.ve_stop, events), self.mapping(events.output_stop, events)
-            assert b < e, f'采集数据范围错误: {b} >= {e}'
+            async with self.device.fixture.slot(self.socket, self.rig_config, self.setup_rig) as rig:
+                self._rate, self._limits = rig
+                self.setup_windows()
+                self._guard = BreakdownGuard(self.device, events, self._rate)
+                self.record('try', Vc=Vc, Ve=Ve, rate=self._rate)
+                async with asyncio.TaskGroup() as tg:
+                    fp = tg.create_task(self.device.power_control(events, self.targ))
+                    tg.create_task(self.acquire_all(results, events), name='acquire_all')
+                    tg.create_task(self.total_timeout(events), name='total_timeout')
+                    tg.create_task(self.trim(events), name='trim')
+
+                b, e = self.mapping(events.ve_stop, events), self.mapping(events.output_stop, events)
+                assert b < e, f'采集数据范围错误: {b} >= {e}'
+                self.device.fixture.thermal.record(
+                    self.socket, results['Vce'], results['Ic'], results['Vbe'][b:e], self._rate)
 
             xresults = ReferTargetResult(
                 target_Vce=self.targ.Vce,
@@ -217,14 +455,99 @@ class Search:
                 Vc_delay = events.ve_start - events.start,
                 Ve_delay = events.ve_stop - events.ve_start,
 
-                measurements=results
+                measurements=results,
+                Rc_ohm=self.Rc,
+                Re_ohm=self.Re,
+
+                Vce_se=BatchMeans(self._batch).feed(results['Vce'][b:e]).stderr,
+                Ic_se=BatchMeans(self._batch).feed(results['Ic'][b:e]).stderr,
             )
 
-            self.runner.referTested.emit(xresults)
+            self.record('result', Vce=xresults.Vce, Ic=xresults.Ic, **{
+                name: getattr(events, name) - self._t0
+                for name in ['start', 've_start', 've_stop', 'output_start', 'output_stop']})
+
+            for meas in self._predicted:
+                p = self._predictions[meas]
+                actual = xresults.Vce if meas == 'Vce' else xresults.Ic
+                _log.info(f'[{meas}] 预测渐近值 {p.asymptote:.6g}, 输出阶段平均值 {actual:.6g}')
+
+            self.runner.referTested.emit(xresults.summary(self.runner.raw_tries, self.socket))
             return xresults
+        except BaseException as e:
+            self.record('error', message=str(e))
+            raise
         finally:
             if fp is not None: fp.cancel()
     
+    async def trim(self, events: EventPoint):
+        '''Ve 阶段稳定后按电路模型微调 Vc/Ve, 直到 Vce 和 Ic 都在目标范围内'''
+        # 步进搜索中 Ve 为零的尝试只用于匹配 Vce, 不调节
+        if events.trimmed.is_set() or events.Ve <= 0:
+            events.trimmed.set()
+            return
+        # Rc 为 0 时 Ic 对 Ve 的模型 (Ve - Vbe) / Rc 无定义, 无法按模型调节 Ic
+        if self.Rc <= 0:
+            _log.warning(f'[trim] Rc={self.targ.Rc} 时无法闭环调节, 按当前设定值继续')
+            events.trimmed.set()
+            return
+
+        target = self.targ
+        s = 1.0 if target.Vce >= 0 else -1.0
+        window = self._long['Ic'].size / self._rate
+        # 单次调节使 Ic 的变化不超过目标的 _trim_ratio, Vce 同理
+        limit_ve = _trim_ratio * target.Ic * self.Rc
+        limit_vc = limit_ve + _trim_ratio * abs(target.Vce)
+        try:
+            await events.ve_vce.wait()
+            changed = events.ve_start
+            for step in range(_trim_steps + 1):
+                await events.ve_vce.wait()
+                await events.ve_ic.wait()
+                # 等滑动窗口里只剩最近一次调节后的数据, 留出半个窗口的采集延迟
+                remain = changed + window * 1.5 - time.monotonic()
+                if remain > 0: await asyncio.sleep(remain)
+
+                Vce, Ic = self._long['Vce'].mean, self._long['Ic'].mean
+                if direction(Vce, target.Vce) == 0 and direction(Ic, target.Ic) == 0:
+                    _log.info(f'[trim] 调节完成: Vc={events.Vc:.3f}, Ve={events.Ve:.3f}, Vce={Vce:.3f}, Ic={Ic:.4f}')
+                    return
+                if step == _trim_steps:
+                    _log.warning(f'[trim] 调节 {_trim_steps} 次仍未到达目标, 按当前设定值继续')
+                    return
+
+                # Ic ≈ (Ve - Vbe) / Rc, Vce ≈ Vc - Ve; 调节 Ve 时 Vc 同步变化以保持 Vce
+                Vc, Ve = trim_step(events.Vc, events.Ve, (target.Ic - Ic) * self.Rc, s * (target.Vce - Vce),
+                                   limit_ve, limit_vc, target.Vc_max, target.Ve_max)
+                _log.info(f'[trim] Vce={Vce:.3f}, Ic={Ic:.4f}, 调节 Vc {events.Vc:.3f}->{Vc:.3f}, Ve {events.Ve:.3f}->{Ve:.3f}')
+
+                # Vce = Vc - Ve: Ve 减小时先调 Vc, 增大时先调 Ve, 中间状态的 Vce 只会降低, 不会超调
+                if Ve < events.Ve:
+                    self.device.powerVc.set_voltage(Vc)
+                    self.device.powerVe.set_voltage(Ve)
+                else:
+                    self.device.powerVe.set_voltage(Ve)
+                    self.device.powerVc.set_voltage(Vc)
+                events.Vc, events.Ve = Vc, Ve
+                changed = time.monotonic()
+                self._guard.hold(_trim_interval)
+                self.record('trim', Vc=Vc, Ve=Ve)
+
+                # 限制调节速率, 之后重新判断稳定
+                await asyncio.sleep(_trim_interval)
+                self.reset_settle(events)
+        finally:
+            events.trimmed.set()
+
+    def reset_settle(self, events: EventPoint):
+        '''设定值改变后重新判断 Ve 阶段是否稳定'''
+        events.ve_vce.clear()
+        events.ve_ic.clear()
+        events.ve_vce_stop = events.ve_ic_stop = math.nan
+        self._predictors.clear()
+        self._predictions.clear()
+        self._predicted.clear()
+
     async def total_timeout(self, events: EventPoint):
         try:
             async with asyncio.timeout(self.targ.total_time):
@@ -233,151 +556,199 @@ class Search:
             raise Exception('电路建立稳态的时间过长') from e
         
     async def acquire_all(self, results: dict[Measurement, list[float]], events: EventPoint):
+        if not self.device.fake:
+            store = ChannelStore(results)
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self.device.read_channels(self._limits, store, events.output, self._guard.feed),
+                               name='read_channels')
+                while not store.finished:
+                    chunks = await store.next()
+                    self.runner.context.check_abort()
+                    done = events.output.is_set()
+                    self.record('chunk', state=events.state, done=done, data=chunks)
+                    # 停止输出后各表最后一次读取的数据只保存, 不再判定
+                    if not done: self.analyse(results, events)
+            return
+
         while True:
-            if not self.device.fake:
-                measurements = await self.device.acquire(self._limits)
-                self.runner.context.check_abort()
-                for meas, values in measurements.items():
-                    results[meas].extend(values)
+            await asyncio.sleep(0.100)  # 模拟采样间隔
+            samplecount = int(self._rate * 0.099)
+            self.runner.context.check_abort()
+
+            if events.state == 'start':
+                for meas, values in results.items():
+                    values.clear()
+                self.record('chunk', state=events.state, clear=True, data={})
             else:
-                await asyncio.sleep(0.100)  # 模拟采样间隔
-                samplecount = int(self._rate * 0.099)
-                self.runner.context.check_abort()
-
-                if events.state == 'start':
-                    for meas, values in results.items():
-                        values.clear()
-                else:
-                    for meas, values in results.items():
-                        if meas == 'Ic' or meas == 'Ie':
-                            expect = events.Ve / self.Rc
-                            values.extend(random.gauss(expect, expect * 0.05) for _ in range(samplecount))
-                        else:
-                            expect = events.Vc - events.Ve
-                            expect = expect if self.runner.arg.type == 'NPN' else -expect
-                            expects = [random.gauss(expect, abs(expect * 0.001)) for _ in range(samplecount)]
-                            # expects.sort()
-                            values.extend(expects)
+                chunks = fake_chunks(events, results, self.runner.arg.type, self.Rc, samplecount)
+                for meas, chunk in chunks.items():
+                    results[meas].extend(chunk)
+                    self._guard.feed(meas, chunk)
+                self.record('chunk', state=events.state, done=events.output.is_set(), data=chunks)
 
             if events.output.is_set(): return
-
-            self.check_vce(results['Vce'], events)
-            self.check_ic(results['Ic'], events)
-            self.check_vcb(results['Vcb'])
-            self.check_veb(results['Vbe'])
+            self.analyse(results, events)
+
+    def analyse(self, results: dict[Measurement, list[float]], events: EventPoint):
+        self.process(results, events)
+        # 记录各判定第一次成立的时刻
+        for name in ['vc', 've_vce', 've_ic', 'precise']:
+            if getattr(events, name).is_set() and name not in self._decided:
+                self._decided.add(name)
+                self.record('event', name=name)
+
+    def process(self, results: dict[Measurement, list[float]], events: EventPoint):
+        '''新数据到达后更新滑动统计并执行各项判定, 回放记录时也使用'''
+        for meas, values in results.items():
+            if meas in self._short: self._short[meas].feed(values)
+            if meas in self._long: self._long[meas].feed(values)
+        if events.state == 've':
+            for meas in ['Vce', 'Ic']:
+                if meas not in self._predictors:
+                    self._predictors[meas] = SettlePredictor(self._rate, len(results[meas]))
+                self._predictors[meas].feed(results[meas])
+
+        self.check_vce(events)
+        self.check_ic(events)
+        self.check_precision(results, events)
+        self.check_vcb()
+        self.check_veb()
+
+    def setup_windows(self):
+        # 各通道最新 100ms / 200ms 数据的滑动统计
+        short, long = int(self._rate * 0.100), int(self._rate * 0.200)
+        self._short = { meas: SlidingWindow(short, self._rate) for meas in ['Vce', 'Vcb', 'Vbe'] }
+        self._long = { meas: SlidingWindow(long, self._rate) for meas in ['Vce', 'Ic'] }
+        # Ve 阶段的指数趋近预测, 以及最近一次的预测结果
+        self._predictors: dict[Measurement, SettlePredictor] = {}
+        self._predictions: dict[Measurement, Prediction] = {}
+        self._predicted: set[Measurement] = set()
+        # 输出阶段按 20ms 分批估计标准误差
+        self._batch = max(int(self._rate * 0.020), 1)
+        self._batches: dict[Measurement, BatchMeans] = {}
+
+    def predict_settled(self, meas: Measurement, tolerance: float):
+        '''斜率判据尚未满足时, 按指数趋近模型预测的剩余偏差判断是否已进入稳态'''
+        predictor = self._predictors.get(meas)
+        if predictor is None: return False
+        p = predictor.predict(tolerance)
+        if p is None: return False
+        if meas not in self._predictions and p.settle_time > self.targ.total_time:
+            _log.warning(f'[{meas}] 预测 {p.settle_time:.3f}s 后才能稳定, 超过稳态建立时间 {self.targ.total_time:.3f}s')
+        self._predictions[meas] = p
+        if p.residual > tolerance: return False
+        _log.info(f'[{meas}] 预测已进入稳定状态: 渐近值 {p.asymptote:.6g}, τ={p.tau:.3f}s, '
+                  f'剩余偏差 {p.residual:.3g}, Ve 输出后 {p.elapsed:.3f}s')
+        self._predicted.add(meas)
+        return True
+
+    def log_settle(self, meas: Measurement, events: EventPoint):
+        actual = self.now() - events.ve_start
+        if (p := self._predictions.get(meas)) is None: return
+        source = '预测' if meas in self._predicted else '斜率'
+        _log.info(f'[{meas}] 按{source}判定稳定, 实际耗时 {actual:.3f}s, '
+                  f'最近一次预测的稳定耗时 {p.settle_time:.3f}s, 预测剩余偏差 {p.residual:.3g}')
     
-    def sample_of_last(self, values: list[float], duration: float):
-        sample = int(self._rate * duration)
-        if len(values) < sample: return None
-        return values[-sample:]
-    
-    def check_vce(self, values: list[float], events: EventPoint):
-        # 采样最新的 100ms 数据, 检查是否满足 Vceo
-        duration = 0.100
-        last = self.sample_of_last(values, duration)
-        if not self.device.fake and last is not None:
-            vce = np.average(last)
+    def check_vce(self, events: EventPoint):
+        # 最新的 100ms 数据, 检查是否满足 Vceo
+        last = self._short['Vce']
+        if not self.device.fake and last.full:
+            vce = last.mean
             if abs(vce) > self.targ.Vceo:
                 raise Exception(f'Vce {vce} 超出 Vceo 限值 {self.targ.Vceo}')
 
         match events.state:
             case 'vc':
-                # 采样最新的 200ms 数据
-                duration = 0.200
-                last = self.sample_of_last(values, duration)
-                if last is None: return
-
-                # 线性拟合采样数据
-                times = np.linspace(0, duration, len(last))
-                co = np.polyfit(np.array(times), np.array(last), 1)
-                k, b = float(co[0]), float(co[1])
-
-                # 检查斜率 k 是否在允许范围内, 此处假设变化率不超过 5%
-                tolerance = 0.05 * abs(events.Vc / self.targ.output_time)
-                if abs(k) > tolerance:
-                    _log.debug(f'[Vce] Vc 输出尚未稳定: 斜率 {k} 大于 {tolerance}')
-                    return
-
-                # 检查 Vce 偏差是否在允许范围内
-                bias = abs(abs(np.average(last)) - events.Vc)
-                range = events.Vc * 0.10 + 1.0 # 10% 的偏差范围加上 1V 的容错
-                if bias > range:
-                    _log.debug(f'[Vce] Vc 输出尚未稳定: 偏差 {bias} 大于阈值 {range}')
-                    return
-                
-                _log.info(f'[Vce] Vc 输出进入稳定状态, 斜率 {k}, 偏差 {bias}')
-                events.vc.set()
+                # 最新的 200ms 数据
+                if vc_settled(self._long['Vce'], events.Vc, self.targ.output_time):
+                    events.vc.set()
 
             case 've':
                 if events.ve_vce.is_set():
                     return
                 
-                if last is None: 
+                if not last.full: 
                     _log.debug('[Vce] 尚未采集到足够的数据')
                     return
                 
-                # 线性拟合采样数据
-                times = np.linspace(0, duration, len(last))
-                co = np.polyfit(np.array(times), np.array(last), 1)
-                k, b = float(co[0]), float(co[1])
-
                 # 检查斜率 k 是否在允许范围内, 此处假设变化率不超过 10%
+                # 斜率未满足时, 预测剩余偏差在目标的 2% 以内也视为稳定
+                k = last.slope
                 tolerance = 0.10 * abs(self.targ.Vce / self.targ.output_time)
                 if not self.device.fake and abs(k) > tolerance:
-                    _log.debug(f'[Vce] Ve 输出尚未稳定: 斜率 {k} 大于 {tolerance}')
-                    return
+                    if not self.predict_settled('Vce', abs(self.targ.Vce) * 0.02):
+                        _log.debug(f'[Vce] Ve 输出尚未稳定: 斜率 {k} 大于 {tolerance}')
+                        return
                 
-                bias = abs(np.average(last) - events.Vc)
+                bias = abs(last.mean - events.Vc)
                 _log.info(f'[Vce] Ve 输出进入稳定状态, 斜率 {k}, 偏差 {bias}')
+                self.log_settle('Vce', events)
 
                 # 用测试点数计算 Ve 停止采集的时间，排除最后 100ms
-                prev = len(values) - len(last)
+                prev = last.total - last.count
                 events.ve_vce_stop = events.start + prev / self._rate
                 events.ve_vce.set()
             
-    def check_ic(self, values: list[float], events: EventPoint):
+    def check_ic(self, events: EventPoint):
         match events.state:
             case 've':
                 if events.ve_ic.is_set():
                     return
                 
-                # 采样最新的 200ms 数据
-                duration = 0.200
-                last = self.sample_of_last(values, duration)
-                if last is None: 
+                # 最新的 200ms 数据
+                window = self._long['Ic']
+                if not window.full: 
                     _log.debug('[Ic] 尚未采集到足够的数据')
                     return
                 
-                # 线性拟合采样数据
-                times = np.linspace(0, duration, len(last))
-                co = np.polyfit(np.array(times), np.array(last), 1)
-                k, b = float(co[0]), float(co[1])
-
                 # 检查斜率 k 是否在允许范围内, 此处假设变化率不超过 5%
+                k = window.slope
                 tolerance = 0.05 * abs(self.targ.Ic / self.targ.output_time)
                 if not self.device.fake and abs(k) > tolerance:
-                    _log.debug(f'[Ic] 尚未稳定: 斜率 {k} 大于 {tolerance}')
-                    return
+                    if not self.predict_settled('Ic', abs(self.targ.Ic) * 0.02):
+                        _log.debug(f'[Ic] 尚未稳定: 斜率 {k} 大于 {tolerance}')
+                        return
                 
-                bias = abs(np.average(last) - self.targ.Ic)
+                bias = abs(window.mean - self.targ.Ic)
                 _log.info(f'[Ic] 进入稳定状态, 斜率 {k}, 偏差 {bias}')
+                self.log_settle('Ic', events)
                 
-                # 用测试点数计算 Ve 停止采集的时间，排除最后 100ms
-                prev = len(values) - len(last)
+                # 用测试点数计算 Ve 停止采集的时间，排除最后 200ms
+                prev = window.total - window.count
                 events.ve_ic_stop = events.start + prev / self._rate
                 events.ve_ic.set()
 
-    def check_vcb(self, values: list[float]):
+    def check_precision(self, results: dict[Measurement, list[float]], events: EventPoint):
+        if events.state != 'output' or self.targ.precision <= 0 or events.precise.is_set():
+            return
+
+        if not self._batches:
+            b = self.mapping(events.ve_stop, events)
+            self._batches = { meas: BatchMeans(self._batch, b) for meas in ['Vce', 'Ic'] }
+        for meas, batches in self._batches.items():
+            batches.feed(results[meas])
+
+        elapsed = self.now() - events.output_start
+        if elapsed < self.targ.min_output_time: return
+
+        errors = { meas: batches.stderr / max(abs(batches.mean), 1e-12) for meas, batches in self._batches.items() }
+        if not all(error <= self.targ.precision for error in errors.values()): return
+
+        _log.info(f'[output] 输出 {elapsed:.3f}s 后相对标准误差 Vce {errors["Vce"]:.3g}, Ic {errors["Ic"]:.3g}, '
+                  f'提前 {self.targ.output_time - elapsed:.3f}s 结束输出')
+        events.precise.set()
+
+    def check_vcb(self):
         if self.device.fake: return
-        if last := self.sample_of_last(values, 0.100):
-            avg = np.average(last)
+        if (last := self._short['Vcb']).full:
+            avg = last.mean
             if abs(avg) > self.targ.Vcbo:
                 raise Exception(f'Vcb {avg} 超出 Vcbo 限值 {self.targ.Vcbo}')
             
-    def check_veb(self, values: list[float]):
+    def check_veb(self):
         if self.device.fake: return
-        if last := self.sample_of_last(values, 0.100):
-            avg = np.average(last)
+        if (last := self._short['Vbe']).full:
+            avg = last.mean
             if abs(avg) > self.targ.Vebo:
                 raise Exception(f'Veb {avg} 超出 Vebo 限值 {self.targ.Vebo}')
     
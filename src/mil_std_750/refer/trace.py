@@ -0,0 +1,185 @@
+from __future__ import annotations
+import logging, json, gzip, math, time, typing, sys
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+import numpy as np
+from types import SimpleNamespace
+from ..worker.common import TargetArgument, EventPoint
+from .. import config_dir
+
+if typing.TYPE_CHECKING:
+    from .task import Search
+
+_log = logging.getLogger(__name__)
+
+class TraceWriter:
+    '''
+    记录参考测试的搜索过程, 每行一条 JSON 记录, gzip 压缩:
+    target (目标参数), try (设定值和采样率), chunk (每次到达的各通道数据), event (判定结果的时刻),
+    trim (闭环调节的设定值), result (事件时刻和输出阶段均值) 或 error;
+    try 内的时间都相对该次尝试开始
+    '''
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    @classmethod
+    def create(cls, name: str):
+        return cls(config_dir / 'traces' / f'{name}-{time.strftime("%Y%m%d-%H%M%S")}.jsonl.gz')
+
+    def write(self, kind: str, **data):
+        self._file.write(json.dumps({'kind': kind, **data}, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self._file.close()
+        _log.info(f'[trace] 搜索过程已记录到 {self.path}')
+
+@dataclass
+class TraceTry:
+    Vc: float
+    Ve: float
+    rate: float
+    records: list[dict] = field(default_factory=list) # chunk, event, trim
+    result: dict | None = None
+
+@dataclass
+class TraceTarget:
+    targ: TargetArgument
+    type: str
+    Rc: float
+    Re: float
+    fake: bool
+    tries: list[TraceTry] = field(default_factory=list)
+
+def read_trace(path: Path):
+    targets: list[TraceTarget] = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record: dict = json.loads(line)
+            match record.pop('kind'):
+                case 'target':
+                    targets.append(TraceTarget(
+                        TargetArgument(**record['targ']), record['type'], record['Rc'], record['Re'], record['fake']))
+                case 'try':
+                    targets[-1].tries.append(TraceTry(record['Vc'], record['Ve'], record['rate']))
+                case 'result':
+                    targets[-1].tries[-1].result = record
+                case 'error':
+                    pass
+                case kind:
+                    targets[-1].tries[-1].records.append({'kind': kind, **record})
+    return targets
+
+@dataclass
+class ReplayTry:
+    recorded: dict[str, float] # 记录中的 ve_stop, output_stop (s)
+    replayed: dict[str, float] # 回放中的 ve_stop, output_stop (s), 未判定时为 nan
+    Vce: float # 回放确定的输出阶段均值
+    Ic: float
+    matched: bool
+
+    @property
+    def saved(self):
+        '''回放比记录提前结束输出的时间'''
+        stop = self.replayed['output_stop']
+        return self.recorded['output_stop'] - stop if not math.isnan(stop) else 0.0
+
+def _replay_search(target: TraceTarget, trial: TraceTry):
+    from .task import Search
+    search: Search = Search.__new__(Search)
+    search.targ = target.targ
+    search.Rc, search.Re = target.Rc, target.Re
+    search.socket = 0
+    device = SimpleNamespace(fake=target.fake, type=target.type)
+    search.runner = typing.cast(typing.Any, SimpleNamespace(device=device, trace=None))
+    search._trace = None
+    search._rate = trial.rate
+    search.setup_windows()
+    return search
+
+def replay_try(target: TraceTarget, trial: TraceTry):
+    '''
+    按记录的数据和状态切换重放一次尝试, 判定逻辑使用当前的 Search 代码;
+    回放不能改变设定值, 只比较判定稳定和提前结束的时刻
+    '''
+    from .task import direction
+    assert trial.result is not None
+    search = _replay_search(target, trial)
+    recorded = trial.result
+    events = EventPoint(trial.Vc, trial.Ve)
+    events.start = recorded['start']
+    results: dict = { 'Vce': [], 'Ic': [], 'Ie': [], 'Vbe': [], 'Vcb': [] }
+    clock = [0.0]
+    search.now = lambda: clock[0]
+
+    for record in trial.records:
+        clock[0] = record['t']
+        match record['kind']:
+            case 'chunk':
+                events.state = record['state']
+                if events.state == 've' and math.isnan(events.ve_start):
+                    events.ve_start = recorded['ve_start']
+                if events.state == 'output' and math.isnan(events.output_start):
+                    events.output_start = recorded['output_start']
+                    if not events.ve_vce.is_set() or not events.ve_ic.is_set():
+                        _log.warning('[replay] 回放未判定 Ve 阶段稳定, 记录中已进入输出阶段')
+                        events.ve_vce_stop = events.ve_ic_stop = recorded['ve_stop']
+                        events.ve_vce.set()
+                        events.ve_ic.set()
+                if record.get('clear'):
+                    for values in results.values(): values.clear()
+                for meas, values in record['data'].items():
+                    results[meas].extend(values)
+                # 停止输出后到达的数据只保存, 不再判定
+                if record.get('done'): continue
+                search.process(results, events)
+                if events.precise.is_set() and math.isnan(events.output_stop):
+                    events.output_stop = clock[0]
+            case 'trim':
+                events.Vc, events.Ve = record['Vc'], record['Ve']
+                search.reset_settle(events)
+
+    output_stop = events.output_stop if not math.isnan(events.output_stop) else recorded['output_stop']
+    ve_stop = max(events.ve_vce_stop, events.ve_ic_stop)
+    b = int((ve_stop - events.start) * trial.rate) if not math.isnan(ve_stop) else 0
+    e = int((output_stop - events.start) * trial.rate)
+    Vce = float(np.average(results['Vce'][b:e]))
+    Ic = float(np.average(results['Ic'][b:e]))
+    return ReplayTry(
+        recorded={ 've_stop': recorded['ve_stop'], 'output_stop': recorded['output_stop'] },
+        replayed={ 've_stop': ve_stop, 'output_stop': events.output_stop },
+        Vce=Vce, Ic=Ic,
+        matched=direction(Vce, target.targ.Vce) == 0 and direction(Ic, target.targ.Ic) == 0,
+    )
+
+@dataclass
+class ReplaySummary:
+    tries: int = 0 # 记录中的尝试次数
+    tries_saved: int = 0 # 回放中提前匹配而不必进行的尝试
+    seconds_saved: float = 0.0
+
+def replay(path: Path):
+    '''重放整个记录文件, 统计当前判定逻辑可以节省的尝试次数和时间'''
+    summary = ReplaySummary()
+    for target in read_trace(path):
+        tries = [t for t in target.tries if t.result is not None]
+        summary.tries += len(tries)
+        for i, trial in enumerate(tries):
+            replayed = replay_try(target, trial)
+            summary.seconds_saved += replayed.saved
+            _log.info(f'[replay] Vce={target.targ.Vce}V, Ic={target.targ.Ic}A 第 {i + 1} 次尝试: '
+                      f'Ve 阶段稳定 {replayed.recorded["ve_stop"]:.3f}s -> {replayed.replayed["ve_stop"]:.3f}s, '
+                      f'输出结束 {replayed.recorded["output_stop"]:.3f}s -> {replayed.replayed["output_stop"]:.3f}s, '
+                      f'Vce={replayed.Vce:.3f}, Ic={replayed.Ic:.5f}{", 已匹配" if replayed.matched else ""}')
+            if replayed.matched and i < len(tries) - 1:
+                rest = tries[i + 1:]
+                summary.tries_saved += len(rest)
+                summary.seconds_saved += sum(t.result['output_stop'] for t in rest if t.result)
+                break
+    _log.info(f'[replay] 共 {summary.tries} 次尝试, 可省去 {summary.tries_saved} 次, 节省约 {summary.seconds_saved:.1f}s')
+    return summary
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for arg in sys.argv[1:]: print(asdict(replay(Path(arg))))
@@ -1,9 +1,42 @@
-import time, math, logging
+import asyncio, math, time, logging, typing
 from PySide6.QtCore import QObject
 from PySide6.QtSerialPort import QSerialPort, QSerialPortInfo
 
 _log = logging.getLogger(__name__)
 
+# 协议版本 2 (见 SerialCommunication/main.c):
+#   请求 AA 02 CMD P0 P1 P2 P3 CHK 55
+#   应答 A5 02 CMD P0 P1 P2 P3 CHK 5A, P0~P3 为固件实际输出的端口状态
+# CHK 为从版本号到 P3 的异或校验, 固件校验失败时应答 CMD | 0x80
+_version = 0x02
+_cmd_set = 0x01
+_cmd_query = 0x02
+_cmd_nak = 0x80
+_baud_v1 = 9600
+_baud_v2 = 57600
+_poll_interval = 0.005 # 等待回复时的轮询间隔 (s)
+
+def _checksum(data: bytes):
+    chk = 0
+    for b in data: chk ^= b
+    return chk
+
+def _frame_v2(cmd: int, ports: bytes):
+    body = bytes([_version, cmd, *ports])
+    return bytes([0xAA, *body, _checksum(body), 0x55])
+
+def _parse_ack_v2(buffer: bytes, cmd: int):
+    begin = buffer.find(b'\xA5' + bytes([_version]))
+    while 0 <= begin <= len(buffer) - 9:
+        frame = buffer[begin:begin + 9]
+        if frame[8] == 0x5A and _checksum(frame[1:7]) == frame[7]:
+            if frame[2] == cmd | _cmd_nak:
+                raise Exception(f'电阻箱校验失败: {frame.hex(" ")}')
+            if frame[2] == cmd:
+                return bytes(frame[3:7])
+        begin = buffer.find(b'\xA5' + bytes([_version]), begin + 1)
+    return None
+
 def ohm_to_float(ohm: str):
     return float(ohm.replace('k', 'e3'))
 
@@ -17,7 +50,58 @@ values = {
     100e3: '100k'
 }
 
-# TODO: 通过压降计算合适的电阻档位，让电源调节精度提高
+auto = 'auto'
+
+Vbe_typical = 0.7 # 电路模型估算用的 Vbe
+
+def operating_point(Vce: float, Ic: float, Rc: float, Vbe: float = Vbe_typical):
+    '''参考测试的电路模型: Ve ≈ Vbe + Ic * Rc, Vc = |Vce| + Ve; Rc 为欧姆值, 返回 (Vc, Ve)'''
+    Ve = Vbe + Ic * Rc
+    return abs(Vce) + Ve, Ve
+
+def _plan_one(name: str, Ic: float, headroom: float, resolution: float, tolerance: float):
+    best: str | None = None
+    fits = False
+    for value, text in values.items():
+        if Ic * value > headroom: break
+        fits = True
+        # 电源每个分辨率步进引起的 Ic 变化超过 tolerance 时无法把 Ic 调到目标
+        if value <= 0 or resolution / (value * Ic) > tolerance: continue
+        best = text
+    if best is None:
+        if fits: raise Exception(f'Ic={Ic}A 时余量内的 {name} 档位调节精度不足 (电源分辨率 {resolution}V)')
+        raise Exception(f'Ic={Ic}A 时 {name} 上的压降超出电源限值, 没有可用的电阻档位')
+    return best
+
+def plan_resist(Vce: float, Ic: float, Vc_max: float, Ve_max: float,
+                resolution: float = 0.001, Vbe: float = Vbe_typical, margin: float = 0.9, tolerance: float = 0.05):
+    '''
+    根据目标工作点的压降分别选择 Rc, Re 档位, 返回 (Rc, Re)
+
+    与参考测试的搜索使用相同的电路模型 (operating_point): Ve ≈ Vbe + Ic * Rc, Vc = |Vce| + Ve,
+    所以 Ic * Rc 同时受 Ve 和 Vc 的限值约束; Re 不在模型中, 按最坏情况 Ic * Re 由 Ve 在 Vbe 之外提供;
+    都要留出 margin 的余量; 电源每个分辨率步进对应的 Ic 变化 (resolution / R / Ic) 超过 tolerance 的档位不用,
+    其余档位中选择阻值最大的, 使 Ic 调节最细
+    '''
+    if Ic <= 0: raise Exception(f'目标 Ic {Ic} 无效')
+    Rc = _plan_one('Rc', Ic, min(Ve_max * margin - Vbe, Vc_max * margin - abs(Vce) - Vbe), resolution, tolerance)
+    Re = _plan_one('Re', Ic, Ve_max * margin - Vbe, resolution, tolerance)
+    _log.debug(f'[plan] Vce={Vce}V, Ic={Ic}A 选择电阻档位 Rc={Rc}, Re={Re}, '
+               f'Ic 调节精度 {resolution / ohm_to_float(Rc) / Ic:.2%}/{resolution / ohm_to_float(Re) / Ic:.2%}')
+    return Rc, Re
+
+# 多工位夹具: P2 的 8 位和 P3.2~P3.7 的 6 位各驱动一个工位继电器 (低电平有效),
+# P3.0/P3.1 为单片机串口引脚, 必须保持高电平
+max_sockets = 14
+
+def _socket_bits(socket: int | None):
+    if socket is None: return 0xFF, 0xFF
+    if not 0 <= socket < max_sockets:
+        raise Exception(f'夹具工位 {socket + 1} 超出范围 (1~{max_sockets})')
+    if socket < 8:
+        return (~(1 << socket)) & 0xFF, 0xFF
+    return 0xFF, (~(1 << (socket - 6))) & 0xFF
+
 def _resist_bit(res: float | str):
     if isinstance(res, str):
         res = ohm_to_float(res)
@@ -36,12 +120,14 @@ def _resist_bit(res: float | str):
     return values[value], bits
 
 class Resist(QObject):
-    def __init__(self, info: str, fake: bool = False, parent: QObject | None = None) -> None:
+    def __init__(self, info: str, fake: bool = False, calibration: dict[str, dict[str, float]] | None = None,
+                 parent: QObject | None = None) -> None:
         super().__init__(parent)
         self._fake = fake
+        self.calibration = calibration or {}
         if not fake:
             port = QSerialPort(info, self)
-            port.setBaudRate(9600)
+            port.setBaudRate(_baud_v2)
             if not port.open(QSerialPort.OpenModeFlag.ReadWrite):
                 port.deleteLater()
                 raise Exception(port.errorString())
@@ -49,54 +135,139 @@ class Resist(QObject):
             
         self.res1 = 0xFF
         self.res2 = 0xFF
+        self.socket: int | None = None
+        self.protocol = 2
+        self._lock = asyncio.Lock()
 
     def disconnects(self):
         if self._fake: return
         self.port.close()
         self.deleteLater()
 
-    def _apply(self):
-        if self._fake: return True
+    def ohms(self, channel: int, res: str) -> float:
+        '''通道 channel 上档位 res 的实测阻值, 未校准时使用标称值'''
+        measured = self.calibration.get(str(channel), {}).get(res)
+        return ohm_to_float(res) if measured is None else float(measured)
+
+    @property
+    def _ports(self):
+        return bytes([self.res1, self.res2, *_socket_bits(self.socket)])
+
+    def _flush(self):
         if self.port.bytesAvailable(): self.port.readAll()
-        cmd = bytes([0xAA, self.res1, self.res2, 0xFF, 0xFF, 0x55])
-        xcmd = cmd.hex(" ")
-        _log.debug(f'try apply: {xcmd}')
+
+    async def _read_until(self, match: typing.Callable[[bytes], typing.Any], timeout: float):
+        # 串口只做零超时的非阻塞轮询, 等待回复期间让出事件循环, 万用表读取和击穿保护照常运行
+        buffer = bytearray()
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    self.port.waitForBytesWritten(0)
+                    self.port.waitForReadyRead(0)
+                    if self.port.bytesAvailable():
+                        buffer += self.port.readAll().data()
+                        result = match(bytes(buffer))
+                        if result is not None: return result
+                    await asyncio.sleep(_poll_interval)
+        except TimeoutError:
+            if buffer: _log.warning(f'回复不匹配: {bytes(buffer).hex(" ")}')
+            return None
+
+    async def _request_v2(self, cmd: int, ports: bytes, retries: int = 3):
+        frame = _frame_v2(cmd, ports)
+        _log.debug(f'try request: {frame.hex(" ")}')
+        for _ in range(retries):
+            self._flush()
+            self.port.write(frame)
+            state = await self._read_until(lambda buffer: _parse_ack_v2(buffer, cmd), 0.050)
+            if state is not None: return state
+            await asyncio.sleep(0.005)
+        return None
+
+    async def _apply_v1(self):
+        self._flush()
+        cmd = bytes([0xAA, *self._ports, 0x55])
+        _log.debug(f'try apply: {cmd.hex(" ")}')
         for _ in range(3):
             self.port.write(cmd)
-            if self.port.waitForReadyRead(1000):
-                response = self.port.readAll()
-                if not response.contains(cmd):
-                    _log.warning(f'回复不匹配: {response}')
+            if await self._read_until(lambda buffer: buffer if cmd in buffer else None, 1.000) is not None:
                 return True
-            time.sleep(0.200)
+            await asyncio.sleep(0.200)
         return False
 
-    def reconfig(self):
+    async def _apply(self):
+        if self._fake: return True
+        async with self._lock:
+            if self.protocol < 2: return await self._apply_v1()
+
+            begin = time.perf_counter()
+            state = await self._request_v2(_cmd_set, self._ports)
+            if state is None: return False
+            if state != self._ports:
+                _log.warning(f'电阻箱端口状态不匹配: {state.hex(" ")}')
+                return False
+            _log.debug(f'电阻箱切换耗时 {(time.perf_counter() - begin) * 1e3:.1f}ms')
+            return True
+
+    async def _negotiate(self):
+        # 先尝试新协议, 无应答时退回 9600 波特率的旧协议
+        self.port.setBaudRate(_baud_v2)
+        self.protocol = 2
+        if await self._request_v2(_cmd_query, bytes(4), 2) is not None:
+            _log.info(f'电阻箱协议版本 {_version}, 波特率 {_baud_v2}')
+            return
+        self.port.setBaudRate(_baud_v1)
+        self.protocol = 1
+        _log.warning(f'电阻箱未响应新协议, 使用旧协议, 波特率 {_baud_v1}')
+
+    async def query_state(self):
+        if self._fake: return self._ports
+        if self.protocol < 2: return None
+        async with self._lock:
+            return await self._request_v2(_cmd_query, bytes(4))
+
+    async def reconfig(self):
+        if not self._fake:
+            async with self._lock: await self._negotiate()
         self.res1 = self.res2 = 0xFF
-        success = self._apply()
+        self.socket = None
+        success = await self._apply()
         if not success: raise Exception('重置电阻箱失败')
         _log.info('重置电阻箱')
 
-    def set_resist1(self, res1: float | str):
+    async def set_socket(self, socket: int | None):
+        if socket == self.socket: return
+        old, self.socket = self.socket, socket
+        if not await self._apply():
+            self.socket = old
+            raise Exception(f'切换夹具工位 {socket} 失败')
+        _log.info(f'切换夹具工位 {"无" if socket is None else socket + 1}')
+
+    async def set_resist1(self, res1: float | str):
         value, self.res1 = _resist_bit(res1)
-        if not self._apply():
+        if not await self._apply():
             raise Exception(f'设置通道一为 {value} 失败')
         _log.info(f'设置通道一为 {value}')
         return value
 
-    def set_resist2(self, res2: float | str):
+    async def set_resist2(self, res2: float | str):
         value, self.res2 = _resist_bit(res2)
-        if not self._apply():
+        if not await self._apply():
             raise Exception(f'设置通道二为 {value} 失败')
         _log.info(f'设置通道二为 {value}')
         return value
 
-    def set_resists(self, res1: float | str, res2: float | str):
+    async def set_resists(self, res1: float | str, res2: float | str):
         value1, bits1 = _resist_bit(res1)
         value2, bits2 = _resist_bit(res2)
+        if (bits1, bits2) == (self.res1, self.res2):
+            _log.debug(f'电阻箱已是 {value1}, {value2}')
+            return value1, value2
+        old = (self.res1, self.res2)
         self.res1 = bits1
         self.res2 = bits2
-        if not self._apply():
+        if not await self._apply():
+            self.res1, self.res2 = old
             raise Exception(f'设置通道一为 {value1}，通道二为 {value2} 失败')
         _log.info(f'设置电阻箱通道一为 {value1}')
         _log.info(f'设置电阻箱通道二为 {value2}')
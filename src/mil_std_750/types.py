@@ -1,5 +1,10 @@
+import math
 from typing import Literal, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
+from .resist import ohm_to_float
+
+# 电阻箱校准表: 通道 ('1', '2') -> 档位 ('0', '1', ..., '100k') -> 实测阻值 (Ω)
+ResistCalibration = dict[str, dict[str, float]]
 
 @dataclass
 class Devices:
@@ -8,6 +13,8 @@ class Devices:
     power2: str
     resist: str
     fake: bool = False
+    resist_calibration: ResistCalibration = field(default_factory=dict)
+    sockets: int = 1 # 多工位夹具的工位数
 
 @dataclass
 class ReferTarget:
@@ -32,6 +39,26 @@ class ReferArgument:
 
     targets: list[ReferTarget]
 
+    # model: 按电路模型求解 Vc/Ve, 未收敛时改用步进搜索; ladder: 只用步进搜索
+    search: Literal['model', 'ladder'] = 'model'
+
+    # 输出阶段 Vce 和 Ic 的相对标准误差都小于 precision 时提前结束, 但不短于 min_duration; 0 为不启用
+    precision: float = 0.0
+    min_duration: float = 0.350
+
+    # Ve 阶段稳定后按实测 Vce/Ic 闭环微调 Vc/Ve, 一次尝试即可到达目标点
+    trim: bool = False
+
+    # 按继电器/量程切换和冷却时间规划目标的测试顺序, 结果仍按原顺序排列
+    reorder: bool = False
+
+    # 数据手册的 SOA 边界折点 (Vce/V, Ic/A) 和降额系数, 用于生成扫描目标
+    soa: list[tuple[float, float]] = field(default_factory=list)
+    derating: float = 0.8
+
+    # 记录每次尝试的数据和判定, 用于离线回放 (refer.trace)
+    trace: bool = False
+
     @classmethod
     def fromdict(cls, data: dict[str, Any]):
         return cls(
@@ -45,6 +72,14 @@ class ReferArgument:
             Vcbo=data.get('Vcbo', 200.0),
             Vebo=data.get('Vebo', 200.0),
             targets=[ReferTarget(**t) for t in data.get('targets', [])],
+            search=data.get('search', 'model'),
+            precision=data.get('precision', 0.0),
+            min_duration=data.get('min_duration', 0.350),
+            trim=data.get('trim', False),
+            reorder=data.get('reorder', False),
+            soa=[(v, i) for v, i in data.get('soa', [])],
+            derating=data.get('derating', 0.8),
+            trace=data.get('trace', False),
         )
 
 @dataclass
@@ -95,6 +130,10 @@ class ReferAllResult:
 
 Measurement = Literal['Vce', 'Vcb', 'Vbe', 'Ic', 'Ie']
 
+def resist_value(nominal: str, measured: float):
+    '''电阻档位的阻值: 有校准后的实测值时使用实测值, 否则使用标称值'''
+    return ohm_to_float(nominal) if math.isnan(measured) else measured
+
 @dataclass
 class ReferTargetResult:
     target_Vce: float
@@ -113,6 +152,57 @@ class ReferTargetResult:
 
     measurements: dict[Measurement, list[float]]
 
+    # 电阻箱校准后的实测阻值, 未校准时为 nan
+    Rc_ohm: float = math.nan
+    Re_ohm: float = math.nan
+
+    # 输出阶段 Vce, Ic 均值的标准误差 (批均值法)
+    Vce_se: float = math.nan
+    Ic_se: float = math.nan
+
+    @property
+    def Rc_value(self):
+        return resist_value(self.Rc, self.Rc_ohm)
+
+    def summary(self, raw: bool = False, socket: int = 0):
+        fields = { k: v for k, v in vars(self).items() if k != 'measurements' }
+        return ReferTrySummary(**fields, measurements=self.measurements if raw else None, socket=socket)
+
+    def tuple(self): 
+        return self.summary().tuple()
+    
+    def dict(self):
+        return asdict(self)
+
+@dataclass
+class ReferTrySummary:
+    '''一次尝试的均值和时间, 跨线程发送给界面; 只在明确要求时附带采样数据'''
+    target_Vce: float
+    target_Ic: float
+
+    Vce: float
+    Ic: float
+
+    Vc: float
+    Ve: float
+    Rc: str
+    Re: str
+
+    Vc_delay: float
+    Ve_delay: float
+
+    Rc_ohm: float = math.nan
+    Re_ohm: float = math.nan
+    Vce_se: float = math.nan
+    Ic_se: float = math.nan
+
+    measurements: dict[Measurement, list[float]] | None = None
+    socket: int = 0 # 多工位夹具的工位下标
+
+    @property
+    def Rc_value(self):
+        return resist_value(self.Rc, self.Rc_ohm)
+
     def tuple(self): 
         return [
             f'{self.target_Vce:.3f}',
@@ -121,20 +211,19 @@ class ReferTargetResult:
             f'{self.Ic:.6f}',
             f'{self.Vc:.3f}',
             f'{self.Ve:.3f}',
-            f'{self.Ve - self.Ic * float(self.Rc.replace("k", "e3"))}',
+            f'{self.Ve - self.Ic * self.Rc_value}',
             f'{self.Rc}',
             f'{self.Re}',
             f'{self.Vc_delay:.3f}',
             f'{self.Ve_delay:.3f}',
+            f'{self.socket + 1}',
         ]
-    
-    def dict(self):
-        return asdict(self)
 
 @dataclass
 class ReferResults:
     argument: ReferArgument
     results: list[ReferTargetResult]
+    socket: int = 0
 
 @dataclass
 class ExecItem:
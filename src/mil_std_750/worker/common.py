@@ -1,12 +1,15 @@
 from __future__ import annotations
-import logging, asyncio, math, time, typing
+import logging, asyncio, math, time, typing, random
 from dataclasses import dataclass
 from contextlib import AsyncExitStack, ExitStack
-from PySide6.QtCore import QObject, Signal, Slot, QMutex
+from PySide6.QtCore import QObject, Signal, QMutex
 from ..types import Devices, Measurement
 from ..dmm import MultiMeter
 from ..power import PowerCV
-from ..resist import Resist
+from ..resist import Resist, Vbe_typical
+from .fixture import FixtureScheduler
+from .loop import LoopThread
+from .window import SlidingWindow
 
 _log = logging.getLogger(__name__)
 
@@ -26,8 +29,12 @@ class TargetArgument:
     output_time: float
     total_time: float
 
+    precision: float = 0.0
+    min_output_time: float = 0.0
+    trim: bool = False
+
 class EventPoint:
-    def __init__(self, Vc: float, Ve: float):
+    def __init__(self, Vc: float, Ve: float, trim: bool = False):
         self.Vc = Vc
         self.Ve = Ve
         self.state: typing.Literal['start', 'vc', 've', 'output'] = 'start'
@@ -36,9 +43,13 @@ class EventPoint:
         self.ve_vce = asyncio.Event()
         self.ve_ic = asyncio.Event()
         self.output = asyncio.Event()
+        self.precise = asyncio.Event() # 输出阶段的均值已足够精确, 可以提前结束
+        self.trimmed = asyncio.Event() # Ve 阶段闭环调节完成, 不调节时直接置位
+        if not trim: self.trimmed.set()
 
         self.start: float = math.nan
         self.ve_start: float = math.nan
+        self.output_start: float = math.nan
         self.ve_vce_stop: float = math.nan
         self.ve_ic_stop: float = math.nan
         self.output_stop: float = math.nan
@@ -55,6 +66,8 @@ class DeviceWorker:
         self.type = type
         self._dev_info = dev
         self._disconnects: AsyncExitStack | None = None
+        self.fixture = FixtureScheduler(self, dev.sockets)
+        self._zeroed = False
 
     @property
     def fake(self) -> bool:
@@ -103,7 +116,7 @@ class DeviceWorker:
             self.Power2 = PowerCV(self._dev_info.power2, fake)
             stack.callback(self.Power2.disconnects)
 
-            self.R = Resist(self._dev_info.resist, fake)
+            self.R = Resist(self._dev_info.resist, fake, self._dev_info.resist_calibration)
             stack.callback(self.R.disconnects)
 
             await self.reconfig()
@@ -123,26 +136,48 @@ class DeviceWorker:
         _log.info('正在初始化仪器...')
         for power in [self.Power1, self.Power2]: power.reconfig()
         await self._dmms.reconfig()
-        self.R.reconfig()
+        await self.R.reconfig()
         _log.info('仪器初始化完成')
     
-    def set_resist(self, Rc: str, Re: str):
+    async def set_resist(self, Rc: str, Re: str):
         _log.info(f'{Rc = }, {Re = }')
         match self.type:
-            case 'NPN': return self.R.set_resists(Re, Rc)
-            case 'PNP': return self.R.set_resists(Rc, Re)
+            case 'NPN': return await self.R.set_resists(Re, Rc)
+            case 'PNP': return await self.R.set_resists(Rc, Re)
+            case t: assert False, f'无效的晶体管类型({t})'
+
+    def resist_ohms(self, Rc: str, Re: str):
+        '''按晶体管类型对应的通道返回 Rc, Re 的实测阻值'''
+        match self.type:
+            case 'NPN': return self.R.ohms(2, Rc), self.R.ohms(1, Re)
+            case 'PNP': return self.R.ohms(1, Rc), self.R.ohms(2, Re)
             case t: assert False, f'无效的晶体管类型({t})'
 
     def set_power_current_limits(self, current: float):
         for power in [self.powerVc, self.powerVe]:
             power.set_limit_current(current)
     
-    async def power_control(self, events: EventPoint, common: TargetArgument):
-        if not self.fake:
-            await asyncio.sleep(4.000) # 每次施加电压前等待样品冷却
-
+    async def prepare(self):
+        '''样品断电期间可以完成的准备: 电源设定值归零, 万用表进入等待触发状态'''
         for power in [self.powerVc, self.powerVe]:
             power.set_voltage(0)
+        self._zeroed = True
+        await self._dmms.initiate()
+
+    def cut_outputs(self):
+        '''立即关闭两路电源输出, 不经过 power_control 的退出流程'''
+        for power in [self.powerVe, self.powerVc]:
+            try:
+                power.set_output_state(False)
+            except Exception:
+                _log.exception('关闭电源输出失败')
+
+    async def power_control(self, events: EventPoint, common: TargetArgument):
+        # 施加电压前的样品冷却和仪器准备由 self.fixture 按工位调度
+        if not self._zeroed:
+            for power in [self.powerVc, self.powerVe]:
+                power.set_voltage(0)
+        self._zeroed = False
 
         with self.powerVc, self.powerVe:
             events.start = time.monotonic()
@@ -161,13 +196,19 @@ class DeviceWorker:
             events.state = 've'
             await events.ve_vce.wait()
             await events.ve_ic.wait()
+            await events.trimmed.wait()
             ve_duration = events.ve_stop - events.ve_start
             _log.info(f'[power] 从 Ve 开始输出到 Vce 和 Ic 稳定耗时 {ve_duration:.3f}s')
 
             _log.info(f'[power] 采集{common.output_time:.3f}秒数据...')
             self.set_power_current_limits(common.Ic * 1.3)
             events.state = 'output'
-            await asyncio.sleep(common.output_time)
+            events.output_start = time.monotonic()
+            try:
+                async with asyncio.timeout(common.output_time):
+                    await events.precise.wait()
+            except TimeoutError:
+                pass
             events.output.set()
             events.output_stop = time.monotonic()
 
@@ -191,58 +232,147 @@ class DeviceWorker:
         })
         return rate, { **volts, **currs }
 
-    async def acquire(self, limits: dict[str, float]) -> dict[Measurement, list[float]]:
-        results: dict[Measurement, asyncio.Task[list[float]]] = {}
+    async def read_channels(self, limits: dict[str, float], store: ChannelStore, stop: asyncio.Event,
+                            on_chunk: typing.Callable[[Measurement, list[float]], None] | None = None):
+        '''
+        每块表一个读取任务, 各自连续读取, 快的表不等慢的表; stop 设置后每块表再读一次然后结束;
+        on_chunk 在数据块到达时立即调用, 之后存入 store
+        '''
+        async def read(meas: Measurement, dmm: str):
+            limit = limits.get(dmm, math.inf)
+            def parse(data: bytes) -> float:
+                value = float(data)
+                if abs(value) > limit:
+                    raise Exception(f'[{meas}] 测量值 {value} 超出限制 {limit}, 可能是测量错误')
+                return value
+            meter = self._dmms[dmm]
+            try:
+                while True:
+                    values = await meter.acquire_one(parse)
+                    if values:
+                        if on_chunk is not None: on_chunk(meas, values)
+                        store.push(meas, values)
+                    if stop.is_set(): return
+            finally:
+                store.close(meas)
         async with asyncio.TaskGroup() as tg:
-            meas_keys: list[Measurement] = ['Vce', 'Ic', 'Vbe', 'Vcb', 'Ie']
-            for meas in meas_keys:
-                dmm: str = getattr(self, meas)
-                def parse(data: bytes) -> float:
-                    value = float(data)
-                    limit = limits.get(dmm, math.inf)
-                    if abs(value) > limit:
-                        raise Exception(f'[{meas}] 测量值 {value} 超出限制 {limit}, 可能是测量错误')
-                    return value
-                results[meas] = tg.create_task(self._dmms[dmm].acquire_one(parse))
-        return { meas: result.result() for meas, result in results.items() }
+            for meas in store.channels:
+                tg.create_task(read(meas, getattr(self, meas)), name=f'read_{meas}')
+
+class ChannelStore:
+    '''
+    一次尝试中各通道的采样数据: 读取任务追加数据块并通知消费者,
+    消费者每次取走上次之后新到的数据块, 所有读取任务结束且数据取完后 finished
+    '''
+    def __init__(self, values: dict[Measurement, list[float]]):
+        self.values = values
+        self.channels: list[Measurement] = list(values)
+        self._open = set(self.channels)
+        self._pending: dict[Measurement, list[float]] = {}
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return not self._open and not self._pending
+
+    def push(self, meas: Measurement, values: list[float]):
+        self.values[meas].extend(values)
+        self._pending.setdefault(meas, []).extend(values)
+        self._changed.set()
+
+    def close(self, meas: Measurement):
+        self._open.discard(meas)
+        self._changed.set()
+
+    async def next(self) -> dict[Measurement, list[float]]:
+        '''等待任一通道的新数据, 读取任务都已结束时返回剩余的数据 (可能为空)'''
+        while not self._pending and self._open:
+            self._changed.clear()
+            await self._changed.wait()
+        chunks, self._pending = self._pending, {}
+        return chunks
+
+def fake_chunks(events: EventPoint, channels: typing.Iterable[Measurement], type: str, Rc: float, count: int):
+    '''模拟电路的一个数据块: 输出 Ve 之前没有 Ic, Vce 等于 Vc; Rc 为 0 时按 1Ω 模拟'''
+    Ve = events.Ve if events.state != 'vc' else 0
+    chunks: dict[Measurement, list[float]] = {}
+    for meas in channels:
+        if meas == 'Ic' or meas == 'Ie':
+            expect = max(Ve - Vbe_typical, 0) / (Rc if Rc > 0 else 1.0)
+            chunks[meas] = [random.gauss(expect, expect * 0.05) for _ in range(count)]
+        else:
+            expect = events.Vc - Ve
+            expect = expect if type == 'NPN' else -expect
+            chunks[meas] = [random.gauss(expect, abs(expect * 0.001)) for _ in range(count)]
+    return chunks
+
+def vc_settled(window: SlidingWindow, Vc: float, output_time: float):
+    '''Vc 阶段的 Vce 是否稳定: 斜率不超过 5%, 偏差不超过 10% 加 1V 的容错'''
+    if not window.full: return False
+    k = window.slope
+    tolerance = 0.05 * abs(Vc / output_time)
+    if abs(k) > tolerance:
+        _log.debug(f'[Vce] Vc 输出尚未稳定: 斜率 {k} 大于 {tolerance}')
+        return False
+    bias = abs(abs(window.mean) - Vc)
+    range = Vc * 0.10 + 1.0
+    if bias > range:
+        _log.debug(f'[Vce] Vc 输出尚未稳定: 偏差 {bias} 大于阈值 {range}')
+        return False
+    _log.info(f'[Vce] Vc 输出进入稳定状态, 斜率 {k}, 偏差 {bias}')
+    return True
 
 class Cancellation(Exception):
     pass
 
 class Context(QObject):
     stateChanged = Signal(bool)
-    targetStarted = Signal(float, float) # target Vce, target Ic
+    targetStarted = Signal(float, float, int) # target Vce, target Ic, socket
     message = Signal(str)
 
-    def __init__(self, parent: QObject | None = None) -> None:
+    def __init__(self, thread: LoopThread, parent: QObject | None = None) -> None:
         super().__init__(parent)
         self._mutex = QMutex()
         self._paused: bool = False
-        self._loop = asyncio.new_event_loop()
+        self._thread = thread
+        self._task: asyncio.Task | None = None
+        self._abort_at = math.nan
 
-    @Slot()
     def start(self, type: str, dev: Devices, builder: typing.Callable[[Context], Runner]):
+        '''在任意线程提交一次测试到 IO 线程的事件循环, 返回测试结束时完成的 future'''
+        return self._thread.submit(self._start(type, dev, builder))
+
+    async def _start(self, type: str, dev: Devices, builder: typing.Callable[[Context], Runner]):
+        if self._task is not None:
+            _log.warning('上一次测试尚未结束')
+            return
+        self._task = asyncio.current_task()
         try:
             self._paused = False
 
+            # 仪器 (包括 QSerialPort) 在 IO 线程里创建
             device = DeviceWorker(dev, type)
             runner = builder(self)
 
             _log.info(f'开始测试 {type} 型晶体管')
             self.stateChanged.emit(True)
 
-            async def _run(runner: Runner, device: DeviceWorker):
-                async with device:
+            async with device:
+                try:
                     return await runner.run(device)
-
-            self._loop.run_until_complete(_run(runner, device))
-        except Cancellation:
+                except asyncio.CancelledError:
+                    # 取消已经沿各层 with 关闭了输出, 这里再关一次作为保证
+                    device.cut_outputs()
+                    _log.warning(f'从终止到关闭电源输出耗时 {(time.monotonic() - self._abort_at) * 1000:.1f}ms')
+                    raise Cancellation() from None
+        except (Cancellation, asyncio.CancelledError):
             _log.warning('测试被终止')
             self.message.emit('测试被终止')
         except Exception:
             _log.exception('测试时发生错误')
             self.message.emit('测试失败，请在运行日志查看错误')
         finally:
+            self._task = None
             self.stateChanged.emit(False)
 
     def check_abort(self):
@@ -256,6 +386,15 @@ class Context(QObject):
             self._mutex.lock()
             stack.callback(self._mutex.unlock)
             self._paused = True
+        # 在 IO 线程的事件循环里取消测试任务, 正在等待的 sleep 和仪器读写立即抛出 CancelledError
+        self._abort_at = time.monotonic()
+        self._thread.call(self._cancel)
+
+    def _cancel(self):
+        # 上一次测试遗留的取消请求在 start 重置 _paused 后失效
+        if self._paused and self._task is not None and not self._task.done():
+            _log.info(f'终止请求已送达, 延迟 {(time.monotonic() - self._abort_at) * 1000:.1f}ms')
+            self._task.cancel()
 
 class Runner(typing.Protocol):
     async def run(self, device: DeviceWorker): ...
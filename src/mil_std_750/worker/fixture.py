@@ -0,0 +1,64 @@
+from __future__ import annotations
+import asyncio, logging, time, typing
+from contextlib import asynccontextmanager
+from .thermal import ThermalBudget
+
+if typing.TYPE_CHECKING:
+    from .common import DeviceWorker
+
+_log = logging.getLogger(__name__)
+
+class FixtureScheduler:
+    '''
+    多工位夹具调度: 电源、万用表和电阻箱同一时间只服务一个工位,
+    每个工位在断电后按 thermal 估算的时间各自冷却, 冷却期间其他已冷却的工位可以占用仪器测试
+    '''
+    def __init__(self, device: DeviceWorker, sockets: int = 1, thermal: ThermalBudget | None = None):
+        self.device = device
+        self.sockets = max(1, sockets)
+        self.thermal = thermal or ThermalBudget()
+        self._rig = asyncio.Lock()
+        self._ready_at = [0.0] * self.sockets
+        self._config: typing.Hashable = None
+        self._state: typing.Any = None
+
+    @property
+    def multiple(self):
+        return self.sockets > 1
+
+    async def wait_cooled(self, socket: int):
+        remain = self._ready_at[socket] - time.monotonic()
+        if remain > 0:
+            _log.debug(f'[fixture] 工位{socket + 1} 冷却 {remain:.3f}s')
+            await asyncio.sleep(remain)
+
+    async def _prepare(self, socket: int, config: typing.Hashable,
+                       setup: typing.Callable[[], typing.Awaitable[typing.Any]]):
+        begin = time.monotonic()
+        if self.multiple: await self.device.R.set_socket(socket)
+        if self._config != config:
+            self._config = None
+            self._state = await setup()
+            self._config = config
+        await self.device.prepare()
+        _log.debug(f'[fixture] 工位{socket + 1} 仪器准备耗时 {time.monotonic() - begin:.3f}s')
+
+    @asynccontextmanager
+    async def slot(self, socket: int, config: typing.Hashable,
+                   setup: typing.Callable[[], typing.Awaitable[typing.Any]]):
+        '''
+        等待工位冷却后占用仪器; 仪器当前的量程和电阻配置不是 config 时先调用 setup,
+        返回最近一次 setup 的结果; 退出前应调用 thermal.record 记录本次尝试, 据此计算冷却结束时间
+        '''
+        # 多工位时冷却期间仪器要让给其他工位; 单工位时仪器的准备与冷却同时进行
+        if self.multiple: await self.wait_cooled(socket)
+        async with self._rig:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self.wait_cooled(socket))
+                tg.create_task(self._prepare(socket, config, setup))
+            self.thermal.begin(socket)
+            try:
+                yield self._state
+            finally:
+                cooldown = 0 if self.device.fake else self.thermal.cooldown(socket)
+                self._ready_at[socket] = time.monotonic() + cooldown
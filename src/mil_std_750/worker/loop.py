@@ -0,0 +1,50 @@
+import logging, asyncio, typing
+from concurrent.futures import Future
+from PySide6.QtCore import QObject, QThread, QCoreApplication, QEvent
+
+_log = logging.getLogger(__name__)
+
+T = typing.TypeVar('T')
+
+class LoopThread(QThread):
+    '''
+    IO 线程: 线程内的 asyncio 事件循环一直运行, 测试等任务以 future 的形式提交, 可以同时运行多个;
+    事件循环每隔 interval 秒处理一次本线程的 Qt 事件, 排队调用、QSerialPort 和 deleteLater 照常工作
+    '''
+    def __init__(self, parent: QObject | None = None, interval: float = 0.002):
+        super().__init__(parent)
+        self.loop = asyncio.new_event_loop()
+        self.interval = interval
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._pump())
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks: task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+            _log.debug('IO 线程的事件循环已关闭')
+
+    async def _pump(self):
+        while True:
+            QCoreApplication.processEvents()
+            QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+            await asyncio.sleep(self.interval)
+
+    def submit(self, coro: typing.Coroutine[typing.Any, typing.Any, T]) -> 'Future[T]':
+        '''在任意线程提交协程到 IO 线程运行'''
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, callback: typing.Callable[[], typing.Any]):
+        '''在任意线程安排 callback 在 IO 线程运行'''
+        self.loop.call_soon_threadsafe(callback)
+
+    def stop(self):
+        '''停止事件循环, 取消仍在运行的任务并等待线程结束'''
+        if not self.isRunning(): return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.wait()
@@ -0,0 +1,93 @@
+from __future__ import annotations
+import logging, time, typing
+import numpy as np
+from ..types import Measurement
+
+if typing.TYPE_CHECKING:
+    from .common import DeviceWorker, EventPoint
+
+_log = logging.getLogger(__name__)
+
+class BreakdownError(Exception):
+    pass
+
+class BreakdownGuard:
+    '''
+    二次击穿保护: 每个万用表的数据块到达后立即检查, 不等其他表和搜索逻辑;
+    Ve 开始输出 holdoff 秒后即开始检查, 稳定前以上一个数据块的均值为基准, 稳定后固定基准;
+    短时滑动平均的 Vce 跌落超过 vce_drop 或 Ic 上升超过 ic_rise (且超过 6 倍噪声) 时
+    立即关闭两路电源输出, 然后抛出 BreakdownError
+    '''
+    def __init__(self, device: DeviceWorker, events: EventPoint, rate: float,
+                 vce_drop: float = 0.30, ic_rise: float = 0.20, span: float = 0.005, holdoff: float = 0.050):
+        self.device = device
+        self.events = events
+        self.rate = rate
+        self.vce_drop = vce_drop
+        self.ic_rise = ic_rise
+        self.span = max(int(rate * span), 3) # 滑动平均点数, 避免单点噪声误触发
+        self.holdoff = holdoff # Ve 阶跃的上升沿本身就是 Vce 跌落、Ic 上升, 这段时间不检查
+        self._refs: dict[Measurement, tuple[float, float]] = {} # 基准均值, 滑动平均的噪声
+        self._hold_until = 0.0
+        self.tripped = False
+
+    def hold(self, duration: float):
+        '''主动调节设定值后暂停检查 duration 秒, 之后重新取基准'''
+        self._hold_until = time.monotonic() + duration
+        self._refs.clear()
+
+    @property
+    def armed(self):
+        # Ve 阶跃的上升沿和停止输出后 Vc 回落都是正常的大幅变化, 不检查; 闭环调节时由 hold 暂停
+        events = self.events
+        if events.output.is_set() or time.monotonic() < self._hold_until: return False
+        if events.state == 'output': return True
+        return events.state == 've' and time.monotonic() >= events.ve_start + self.holdoff
+
+    @property
+    def settled(self):
+        events = self.events
+        return events.state == 'output' or (events.ve_vce.is_set() and events.ve_ic.is_set())
+
+    def feed(self, meas: Measurement, values: list[float]):
+        '''values 为一个数据块的新增采样点'''
+        if self.tripped or meas not in ('Vce', 'Ic') or not values: return
+        if not self.armed:
+            self._refs.clear()
+            return
+
+        arrived = time.monotonic()
+        chunk = np.abs(np.asarray(values, dtype=float))
+        if len(chunk) >= self.span:
+            cumsum = np.cumsum(np.insert(chunk, 0, 0.0))
+            smooth = (cumsum[self.span:] - cumsum[:-self.span]) / self.span
+        else:
+            smooth = np.array([chunk.mean()])
+
+        if (refs := self._refs.get(meas)) is None:
+            self._refs[meas] = (float(chunk.mean()), float(chunk.std()) / np.sqrt(self.span))
+            return
+        ref, noise = refs
+        if meas == 'Vce':
+            bad = np.flatnonzero(smooth < min(ref * (1 - self.vce_drop), ref - 6 * noise))
+        else:
+            bad = np.flatnonzero(smooth > max(ref * (1 + self.ic_rise), ref + 6 * noise))
+        if len(bad) == 0:
+            # 稳定前 Vce 和 Ic 仍在缓慢趋近, 基准跟随上一个数据块, 只检测块内或块间的突变
+            if not self.settled:
+                self._refs[meas] = (float(chunk.mean()), float(chunk.std()) / np.sqrt(self.span))
+            return
+
+        # 数据块短于 span 时 smooth 只有整块均值, 以块内最后一点计算延迟
+        index = min(int(bad[0]) + self.span - 1, len(chunk) - 1)
+        value = float(smooth[bad[0]])
+        self.trip(meas, value, ref, arrived, (len(chunk) - index) / self.rate)
+
+    def trip(self, meas: Measurement, value: float, ref: float, arrived: float, age: float):
+        self.tripped = True
+        detected = time.monotonic()
+        self.device.cut_outputs()
+        off = time.monotonic()
+        _log.error(f'[safety] {meas} 由 {ref:.6g} 突变为 {value:.6g}, 疑似二次击穿, 已关闭电源输出; '
+                   f'采样到检测 {(detected - arrived + age) * 1000:.1f}ms, 检测到关断 {(off - detected) * 1000:.1f}ms')
+        raise BreakdownError(f'{meas} 突变 ({ref:.6g} -> {value:.6g}), 样品可能已二次击穿')
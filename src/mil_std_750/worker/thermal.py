@@ -0,0 +1,59 @@
+import logging, math, time
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+class ThermalBudget:
+    '''
+    样品热状态的一阶模型: 每次尝试后按 Vce·Ic 耗散的能量累加热量, 热量按时间常数 tau 指数衰减;
+    输出期间 Vbe 的漂移 (约 -2mV/°C) 作为结温的旁证, 两者都回落到安全阈值以下才允许下一次尝试
+    '''
+    def __init__(self, tau: float = 2.0, energy_safe: float = 0.5,
+                 drift_safe: float = 0.004, max_cooldown: float = 10.0, fallback: float = 4.0):
+        self.tau = tau
+        self.energy_safe = energy_safe # 可以立即再次施加功率的残余热量 (J)
+        self.drift_safe = drift_safe # 可以忽略的 Vbe 漂移 (V)
+        self.max_cooldown = max_cooldown
+        self.fallback = fallback # 没有记录到耗散时 (例如尝试失败) 的冷却时间
+        self._heat: dict[int, tuple[float, float]] = {} # 工位 -> (热量, 记录时间)
+        self._drift: dict[int, float] = {}
+        self._pending: set[int] = set()
+
+    def heat(self, socket: int, now: float | None = None):
+        heat, at = self._heat.get(socket, (0.0, 0.0))
+        now = time.monotonic() if now is None else now
+        return heat * math.exp(-(now - at) / self.tau)
+
+    def begin(self, socket: int):
+        '''开始施加功率; 之后没有 record 时按 fallback 冷却'''
+        self._pending.add(socket)
+
+    def record(self, socket: int, vce: list[float], ic: list[float], vbe: list[float], rate: float):
+        now = time.monotonic()
+        n = min(len(vce), len(ic))
+        energy = float(np.sum(np.abs(np.multiply(vce[:n], ic[:n])))) / rate if n else 0.0
+
+        # 输出期间首尾各 10% 的 Vbe 均值之差, 结温升高时 |Vbe| 下降
+        drift = 0.0
+        m = len(vbe) // 10
+        if m > 0:
+            drift = max(abs(float(np.mean(vbe[:m]))) - abs(float(np.mean(vbe[-m:]))), 0.0)
+
+        self._heat[socket] = (self.heat(socket, now) + energy, now)
+        self._drift[socket] = drift
+        self._pending.discard(socket)
+        _log.debug(f'[thermal] 工位{socket + 1} 耗散 {energy:.3g}J, Vbe 漂移 {drift * 1000:.2f}mV')
+
+    def estimate(self, heat: float, drift: float = 0.0):
+        '''残余热量为 heat (J), Vbe 漂移为 drift (V) 时需要的冷却时间'''
+        ratio = max(heat / self.energy_safe, drift / self.drift_safe, 1.0)
+        return min(self.tau * math.log(ratio), self.max_cooldown)
+
+    def cooldown(self, socket: int):
+        if socket in self._pending:
+            self._pending.discard(socket)
+            return self.fallback
+
+        cooldown = self.estimate(self.heat(socket), self._drift.get(socket, 0.0))
+        _log.info(f'[thermal] 工位{socket + 1} 冷却 {cooldown:.3f}s')
+        return cooldown
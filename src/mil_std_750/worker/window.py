@@ -0,0 +1,190 @@
+import math
+from dataclasses import dataclass
+from collections import deque
+
+class SlidingWindow:
+    '''
+    固定点数的滑动窗口, 随数据到达增量维护均值、方差、最值和线性回归斜率,
+    每次更新的开销只与新到达的点数有关
+    '''
+    def __init__(self, size: int, rate: float):
+        self.size = max(int(size), 2)
+        self.rate = rate
+        self.reset()
+
+    def reset(self):
+        self._values: deque[float] = deque()
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._sum_iy = 0.0 # 下标相对窗口起点
+        self._mins: deque[tuple[int, float]] = deque() # (累计下标, 值), 值单调递增
+        self._maxs: deque[tuple[int, float]] = deque() # (累计下标, 值), 值单调递减
+        self._pops = 0
+        self.total = 0 # 累计推入的点数
+
+    def push(self, y: float):
+        self._sum_iy += len(self._values) * y
+        self._values.append(y)
+        self._sum += y
+        self._sum_sq += y * y
+
+        while self._mins and self._mins[-1][1] >= y: self._mins.pop()
+        self._mins.append((self.total, y))
+        while self._maxs and self._maxs[-1][1] <= y: self._maxs.pop()
+        self._maxs.append((self.total, y))
+        self.total += 1
+
+        if len(self._values) > self.size: self._pop()
+
+    def _pop(self):
+        y = self._values.popleft()
+        self._sum -= y
+        self._sum_sq -= y * y
+        self._sum_iy -= self._sum # 剩余点的下标各减一
+
+        begin = self.total - len(self._values)
+        while self._mins[0][0] < begin: self._mins.popleft()
+        while self._maxs[0][0] < begin: self._maxs.popleft()
+
+        # 每滑过一整个窗口重算一次累加和, 消除浮点误差的累积
+        self._pops += 1
+        if self._pops >= self.size:
+            self._pops = 0
+            self._sum = math.fsum(self._values)
+            self._sum_sq = math.fsum(v * v for v in self._values)
+            self._sum_iy = math.fsum(i * v for i, v in enumerate(self._values))
+
+    def extend(self, values):
+        for y in values: self.push(y)
+
+    def feed(self, values: list[float]):
+        '''values 为持续追加的采样列表, 只处理上次之后新增的点; 列表被清空时重新开始'''
+        if len(values) < self.total: self.reset()
+        self.extend(values[self.total:])
+
+    @property
+    def count(self):
+        return len(self._values)
+
+    @property
+    def full(self):
+        return len(self._values) >= self.size
+
+    @property
+    def mean(self):
+        return self._sum / len(self._values) if self._values else math.nan
+
+    @property
+    def variance(self):
+        n = len(self._values)
+        if n < 2: return math.nan
+        return max(self._sum_sq - self._sum * self._sum / n, 0.0) / (n - 1)
+
+    @property
+    def min(self):
+        return self._mins[0][1] if self._mins else math.nan
+
+    @property
+    def max(self):
+        return self._maxs[0][1] if self._maxs else math.nan
+
+    @property
+    def slope(self):
+        '''最小二乘拟合的斜率, 单位为每秒'''
+        n = len(self._values)
+        if n < 2: return math.nan
+        sx = n * (n - 1) / 2
+        sxx = (n - 1) * n * (2 * n - 1) / 6
+        k = (n * self._sum_iy - sx * self._sum) / (n * sxx - sx * sx)
+        return k * self.rate
+
+@dataclass
+class Prediction:
+    asymptote: float
+    tau: float # 时间常数 (s)
+    residual: float # 当前时刻与渐近值的预测偏差
+    elapsed: float # 已采集的时间 (s)
+    settle_time: float # 预测偏差降到容差以内的时间 (s), 从开始采集算起
+
+class SettlePredictor:
+    '''
+    按指数趋近模型 y = A + B·exp(-t/τ) 预测稳态: 已采集的数据三等分,
+    由三段均值做 Aitken 外推估计渐近值 A 和时间常数 τ, 前缀和保证每次预测为 O(1)
+    '''
+    def __init__(self, rate: float, begin: int = 0, min_duration: float = 0.300):
+        self.rate = rate
+        self.begin = begin # 采样列表中开始计入的下标
+        self.min_samples = max(int(rate * min_duration), 6)
+        self._prefix = [0.0]
+        self._prefix_sq = [0.0]
+
+    def feed(self, values: list[float]):
+        for y in values[self.begin + len(self._prefix) - 1:]:
+            self._prefix.append(self._prefix[-1] + y)
+            self._prefix_sq.append(self._prefix_sq[-1] + y * y)
+
+    def _block(self, i: int, n: int):
+        s = self._prefix[i + n] - self._prefix[i]
+        sq = self._prefix_sq[i + n] - self._prefix_sq[i]
+        return s / n, max(sq - s * s / n, 0.0) / (n - 1)
+
+    def predict(self, tolerance: float) -> Prediction | None:
+        total = len(self._prefix) - 1
+        if total < self.min_samples: return None
+
+        n = total // 3
+        begin = total - 3 * n
+        m1, _ = self._block(begin, n)
+        m2, _ = self._block(begin + n, n)
+        m3, var = self._block(begin + 2 * n, n)
+        d1, d2 = m2 - m1, m3 - m2
+
+        # 段间变化淹没在噪声里时无法拟合, 交给斜率判据
+        noise = 3 * math.sqrt(2 * var / n)
+        if abs(d1) <= noise: return None
+        r = d2 / d1
+        if not 0 < r < 0.95: return None
+
+        T = n / self.rate
+        tau = -T / math.log(r)
+        asymptote = m3 + d2 * r / (1 - r)
+        # 第三段均值的偏差换算为该段结束时刻的瞬时偏差
+        residual = abs(m3 - asymptote) * r * T / (tau * (1 - r))
+        elapsed = total / self.rate
+        settle_time = elapsed
+        if residual > tolerance > 0:
+            settle_time += tau * math.log(residual / tolerance)
+        return Prediction(asymptote, tau, residual, elapsed, settle_time)
+
+class BatchMeans:
+    '''
+    批均值法估计均值的标准误差: 高采样率下相邻点相关, 直接用 σ/√n 会低估误差,
+    改为把数据按固定点数分批, 用批均值的离散程度估计
+    '''
+    def __init__(self, batch: int, begin: int = 0):
+        self.batch = max(int(batch), 1)
+        self.begin = begin # 采样列表中开始计入的下标
+        self._count = 0
+        self._acc = 0.0
+        self._means: list[float] = []
+
+    def feed(self, values: list[float]):
+        for y in values[self.begin + self._count:]:
+            self._count += 1
+            self._acc += y
+            if self._count % self.batch == 0:
+                self._means.append(self._acc / self.batch)
+                self._acc = 0.0
+        return self
+
+    @property
+    def mean(self):
+        return math.fsum(self._means) / len(self._means) if self._means else math.nan
+
+    @property
+    def stderr(self):
+        k = len(self._means)
+        if k < 4: return math.nan
+        mean = self.mean
+        var = math.fsum((m - mean) ** 2 for m in self._means) / (k - 1)
+        return math.sqrt(var / k)
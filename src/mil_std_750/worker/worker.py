@@ -9,6 +9,7 @@ from ..types import *
 from ..resist import Resist, ohm_to_float
 from ..dmm import MultiMeter
 from ..power import PowerCV
+from .thermal import ThermalBudget
 
 _log = logging.getLogger(__name__)
 
@@ -156,10 +157,25 @@ class Worker(QObject):
         self._mutex = QMutex()
         self._paused = False
         self._loop = asyncio.new_event_loop()
+        self._task: asyncio.Task | None = None
+        self._abort_at = math.nan
         self._dmms = MultiMeter()
+        self.thermal = ThermalBudget()
+        self._ready_at = 0.0
 
-    def _async(self, coro):
-        return self._loop.run_until_complete(coro)
+    def _async(self, coro, cancellable: bool = True):
+        task = self._loop.create_task(coro)
+        # 嵌套调用结束后恢复外层任务, 终止时仍能取消外层
+        previous, self._task = self._task, task if cancellable else None
+        try:
+            return self._loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            for power in [getattr(self, 'Power1', None), getattr(self, 'Power2', None)]:
+                if power is not None: power.set_output_state(False)
+            _log.warning(f'从终止到关闭电源输出耗时 {(time.monotonic() - self._abort_at) * 1000:.1f}ms')
+            raise Cancellation() from None
+        finally:
+            self._task = previous
 
     def check_abort(self):
         with ExitStack() as stack:
@@ -172,6 +188,13 @@ class Worker(QObject):
             self._mutex.lock()
             stack.callback(self._mutex.unlock)
             self._paused = True
+        self._abort_at = time.monotonic()
+        self._loop.call_soon_threadsafe(self._cancel)
+
+    def _cancel(self):
+        # 两次 _async 之间送达的请求在下一次 _async 开始时生效
+        if self._paused and self._task is not None and not self._task.done():
+            self._task.cancel()
 
     def setup_devices(self, dev: Devices):
         _log.info('正在连接仪器...')
@@ -186,7 +209,7 @@ class Worker(QObject):
         if hasattr(self, 'Power1'): self.Power1.disconnects(); del self.Power1
         if hasattr(self, 'Power2'): self.Power2.disconnects(); del self.Power2
         if hasattr(self, 'R'): self.R.disconnects(); del self.R
-        self._async(self._dmms.disconnects())
+        self._async(self._dmms.disconnects(), cancellable=False)
 
     @property
     def powerVc(self):
@@ -228,7 +251,7 @@ class Worker(QObject):
                 _log.info('正在初始化仪器...')
                 for power in [self.Power1, self.Power2]: power.reconfig()
                 self._async(self._dmms.reconfig())
-                self.R.reconfig()
+                self._async(self.R.reconfig())
 
                 self.stateChanged.emit(True)
                 stack.enter_context(self.Power1.remote())
@@ -250,8 +273,10 @@ class Worker(QObject):
             self.stateChanged.emit(False)
 
     async def power_control(self, events: Events):
-        # 每次施加电压前等待样品冷却
-        time.sleep(4.000)
+        # 每次施加电压前等待样品冷却, 冷却时间由上一次尝试的耗散估算
+        cooldown = self._ready_at - time.monotonic()
+        if cooldown > 0: await asyncio.sleep(cooldown)
+        self.thermal.begin(0)
 
         common = events.common
 
@@ -427,9 +452,13 @@ class Worker(QObject):
                     tg.create_task(total_timeout(events), name='total_timeout')
 
                 xr = events.results()
+                b, e = events._output_range()
+                vbe = events.all_dmm2 if self.Vbe == 'DMM2' else events.all_dmm3
+                self.thermal.record(0, events.all_vce, events.all_ic, vbe[b:e], events.rate)
                 return xr
             finally:
                 if fp is not None: fp.cancel()
+                self._ready_at = time.monotonic() + self.thermal.cooldown(0)
 
         return self._async(_test(events))
 
@@ -446,11 +475,11 @@ class Worker(QObject):
         self.referComplete.emit(all_results)
         self.message.emit('测试成功，请在数据表查看数据，在持续测试界面进一步测试')
 
-    def set_resist(self, Rc: str, Re: str):
+    async def set_resist(self, Rc: str, Re: str):
         _log.info(f'{Rc = }, {Re = }')
         match self.type:
-            case 'NPN': return self.R.set_resists(Re, Rc)
-            case 'PNP': return self.R.set_resists(Rc, Re)
+            case 'NPN': return await self.R.set_resists(Re, Rc)
+            case 'PNP': return await self.R.set_resists(Rc, Re)
             case t: assert False, f'无效的晶体管类型({t})'
     
     async def setup_dmm_ranges(self, arg: ReferArgument, target: ReferTarget):
@@ -471,7 +500,7 @@ class Worker(QObject):
 
         _log.info(f'[{arg.type}] 测试目标: Vce {target_Vce}, Ic {target_Ic}')
 
-        self.set_resist(target.Rc, target.Re)
+        await self.set_resist(target.Rc, target.Re)
 
         await self._dmms.set_volt_range(
             DMM1=target_Vce,
@@ -517,7 +546,7 @@ class Worker(QObject):
         _log.info(f'[{arg.type}] 测试目标: Vce {target_Vce}, Ic {target_Ic}')
 
         Req = abs(target.Vce) / target_Ic
-        Rc, Re = self.R.set_resists(target.Rc, target.Re)
+        Rc, Re = await self.R.set_resists(target.Rc, target.Re)
         _log.info(f'{Req = }, {Rc = }, {Re = }')
 
         await self._dmms.set_volt_range(
@@ -775,9 +804,9 @@ class Worker(QObject):
         )
 
         if arg.type == 'NPN':
-            self.R.set_resists(item.Rc, item.Re)
+            await self.R.set_resists(item.Rc, item.Re)
         else:
-            self.R.set_resists(item.Re, item.Rc)
+            await self.R.set_resists(item.Re, item.Rc)
 
         await self._dmms.initiate()
         fp = None
@@ -791,6 +820,9 @@ class Worker(QObject):
                 tg.create_task(dmm3(events), name='dmm3')
                 tg.create_task(total_timeout(events), name='total_timeout')
                 tg.create_task(delay(events, item.Ve_delay))
+            b, e = events._output_range()
+            vbe = events.all_dmm2 if self.Vbe == 'DMM2' else events.all_dmm3
+            self.thermal.record(0, events.all_vce, events.all_ic, vbe[b:e], events.rate)
             return ExecResult(
                 type=arg.type,
                 item=item,
@@ -806,3 +838,4 @@ class Worker(QObject):
             )
         finally:
             if fp is not None: fp.cancel()
+            self._ready_at = time.monotonic() + self.thermal.cooldown(0)
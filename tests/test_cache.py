@@ -0,0 +1,36 @@
+import pytest
+from mil_std_750.types import ReferTargetResult
+from mil_std_750.refer.cache import SolutionCache, shift
+
+def result(Vce, Ic, Vc, Ve):
+    return ReferTargetResult(Vce, Ic, Vce, Ic, Vc, Ve, '100', '100', 0.3, 0.4, {})
+
+def test_shift_keeps_vbe_and_offset():
+    # Vbe = 5.7 - 0.05·100 = 0.7, Vc - Ve - Vce = 0.2
+    Vc, Ve = shift(25.9, 5.7, 20, 0.05, 100, 30, 0.08, 100)
+    assert Ve == pytest.approx(0.7 + 0.08 * 100)
+    assert Vc - Ve - 30 == pytest.approx(0.2)
+
+def test_shift_not_negative():
+    _, Ve = shift(25.9, 5.7, 20, 0.05, 100, 30, 0.0, 100)
+    assert Ve >= 0
+
+def test_lookup_exact_and_nearest():
+    cache = SolutionCache()
+    cache.store('t', 'NPN', result(20, 0.05, 25.9, 5.7))
+    cache.store('t', 'NPN', result(80, 0.0125, 82.1, 1.95))
+
+    exact = cache.lookup('t', 'NPN', -20, 0.05, '100', '100', 100)
+    assert exact is not None and exact.exact and exact.Vc == 25.9
+
+    near = cache.lookup('t', 'NPN', 25, 0.05, '100', '100', 100)
+    assert near is not None and not near.exact
+    assert near.Ve == pytest.approx(5.7)
+    assert near.Vc - near.Ve == pytest.approx(25.2)
+
+def test_lookup_other_resist_or_name():
+    cache = SolutionCache()
+    cache.store('t', 'NPN', result(20, 0.05, 25.9, 5.7))
+    assert cache.lookup('t', 'NPN', 20, 0.05, '1k', '100', 1000) is None
+    assert cache.lookup('u', 'NPN', 20, 0.05, '100', '100', 100) is None
+    assert cache.lookup('t', 'PNP', 20, 0.05, '100', '100', 100) is None
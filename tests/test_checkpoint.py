@@ -0,0 +1,35 @@
+import pytest
+from mil_std_750.types import ReferArgument, ReferTargetResult
+from mil_std_750.refer import checkpoint as module
+from mil_std_750.refer.checkpoint import Checkpoint
+
+@pytest.fixture(autouse=True)
+def path(tmp_path, monkeypatch):
+    monkeypatch.setattr(module, '_path', lambda name: tmp_path / f'{name}.json')
+
+def make_arg():
+    return ReferArgument.fromdict(dict(name='t', targets=[dict(Vce=20, Ic=0.05, Rc='100', Re='100')]))
+
+def make_result():
+    return ReferTargetResult(20, 0.05, 20.01, 0.0501, 25.7, 5.7, '100', '100', 0.3, 0.4, {})
+
+def test_resume():
+    arg = make_arg()
+    Checkpoint.open(arg, True).add(0, 0, make_result())
+    resumed = Checkpoint.open(arg, True, resume=True)
+    assert resumed.done(0)[0].Vce == pytest.approx(20.01)
+
+def test_fresh_run_discards_old_checkpoint():
+    # 重新开始的测试在第一个目标完成前中断, 继续时不能读到上一次的结果
+    arg = make_arg()
+    Checkpoint.open(arg, True).add(0, 0, make_result())
+    Checkpoint.open(arg, True)
+    assert not Checkpoint.exists('t')
+    assert Checkpoint.open(arg, True, resume=True).done(0) == {}
+
+def test_changed_argument_restarts():
+    arg = make_arg()
+    Checkpoint.open(arg, True).add(0, 0, make_result())
+    arg.duration = 2.0
+    assert Checkpoint.open(arg, True, resume=True).done(0) == {}
+    assert not Checkpoint.exists('t')
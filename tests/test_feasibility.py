@@ -0,0 +1,22 @@
+from mil_std_750.types import ReferArgument
+from mil_std_750.feasibility import check_refer
+
+def refer(*targets, **limits):
+    return ReferArgument.fromdict(dict(targets=[dict(Vce=v, Ic=i, Rc=rc, Re=re) for v, i, rc, re in targets], **limits))
+
+def test_auto_target_within_ve_max():
+    result = check_refer(refer((20, 0.1, 'auto', 'auto'), Vc_max=200, Ve_max=60))
+    assert not result.errors
+
+def test_rc_exceeding_ve_max_rejected():
+    # 按 Ve ≈ Vbe + Ic·Rc, Rc=1k 需要 Ve≈100V, 与 Re 无关
+    result = check_refer(refer((20, 0.1, '1k', '100'), Vc_max=200, Ve_max=60))
+    assert any('Ve' in e.message for e in result.errors)
+
+def test_rc_exceeding_vc_max_rejected():
+    result = check_refer(refer((150, 0.01, '10k', '10'), Vc_max=200, Ve_max=200))
+    assert any('Vc' in e.message for e in result.errors)
+
+def test_unknown_resist():
+    result = check_refer(refer((20, 0.1, '5', '100')))
+    assert any('5' in e.message for e in result.errors)
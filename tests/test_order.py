@@ -0,0 +1,33 @@
+import pytest
+from mil_std_750.refer.order import Step, plan_order, switch_time
+
+def test_switch_time():
+    a = Step(20, 0.05, '100', '100')
+    assert switch_time(a, a) == 0
+    assert switch_time(a, Step(20, 0.05, '1k', '100')) > 0
+    assert switch_time(a, Step(20, 0.05, '1k', '1k')) > switch_time(a, Step(20, 0.05, '1k', '100'))
+
+def test_groups_same_resist():
+    # 交替的电阻档位重排后相同档位相邻, 额外耗时减少
+    steps = [Step(20, 0.05, '100', '100'), Step(80, 0.0125, '1k', '1k'),
+             Step(25, 0.05, '100', '100'), Step(90, 0.0125, '1k', '1k')]
+    order, before, after = plan_order(steps)
+    assert sorted(order) == [0, 1, 2, 3]
+    assert after < before
+    rcs = [steps[i].Rc for i in order]
+    assert sum(a != b for a, b in zip(rcs, rcs[1:])) == 1
+
+def test_keeps_original_when_no_gain():
+    # 原顺序已是功率递增且档位相同
+    steps = [Step(20, 0.05, '100', '100'), Step(25, 0.05, '100', '100')]
+    assert plan_order(steps)[0] == [0, 1]
+
+def test_greedy_for_many_targets():
+    steps = [Step(20 + i, 0.05, '100' if i % 2 else '1k', '100') for i in range(12)]
+    order, before, after = plan_order(steps)
+    assert sorted(order) == list(range(12))
+    assert after <= before
+
+def test_trivial():
+    assert plan_order([]) == ([], 0.0, 0.0)
+    assert plan_order([Step(20, 0.05, '100', '100')]) == ([0], 0.0, 0.0)
@@ -0,0 +1,39 @@
+import pytest
+from mil_std_750.resist import plan_resist, operating_point, ohm_to_float
+
+def test_operating_point():
+    Vc, Ve = operating_point(-20, 0.1, 100)
+    assert Ve == pytest.approx(10.7)
+    assert Vc == pytest.approx(30.7)
+
+def test_plan_rc_bounded_by_ve_max():
+    # Vc 限值足够时 Rc 仍要受 Ve 限值约束: 1k 需要 Ve≈100V
+    Rc, Re = plan_resist(20, 0.1, 200, 60)
+    assert (Rc, Re) == ('100', '100')
+    Vc, Ve = operating_point(20, 0.1, ohm_to_float(Rc))
+    assert Ve <= 60 * 0.9 and Vc <= 200 * 0.9
+
+def test_plan_rc_bounded_by_vc_max():
+    # Ve 限值足够时 Vc = Vce + Ve 受 Vc 限值约束
+    Rc, _ = plan_resist(150, 0.01, 200, 200)
+    assert Rc == '1k'
+    Vc, _ = operating_point(150, 0.01, ohm_to_float(Rc))
+    assert Vc <= 200 * 0.9
+
+def test_plan_resolution():
+    # 1Ω 时每 1mV 步进引起 Ic 变化 10%, 不满足精度
+    Rc, Re = plan_resist(20, 0.01, 200, 60, resolution=0.001)
+    assert ohm_to_float(Rc) >= 10 and ohm_to_float(Re) >= 10
+
+def test_plan_infeasible():
+    with pytest.raises(Exception):
+        plan_resist(20, 1.0, 30, 0.5)
+    with pytest.raises(Exception):
+        plan_resist(20, 0.0, 200, 60)
+
+def test_resist_value():
+    import math
+    from mil_std_750.types import resist_value
+    assert resist_value('1k', math.nan) == 1000.0
+    assert resist_value('100k', math.nan) == 100e3
+    assert resist_value('1k', 1001.5) == 1001.5
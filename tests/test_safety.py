@@ -0,0 +1,49 @@
+import time
+import numpy as np
+import pytest
+from mil_std_750.worker.common import EventPoint
+from mil_std_750.worker.safety import BreakdownGuard, BreakdownError
+
+class Device:
+    def __init__(self):
+        self.cut = 0
+
+    def cut_outputs(self):
+        self.cut += 1
+
+def armed_guard(rate=10000):
+    events = EventPoint(30, 10)
+    events.state = 've'
+    events.ve_start = time.monotonic() - 1
+    return BreakdownGuard(Device(), events, rate), events
+
+def test_holdoff_after_ve_step():
+    guard, events = armed_guard()
+    events.ve_start = time.monotonic()
+    assert not guard.armed
+    events.ve_start -= guard.holdoff
+    assert guard.armed
+
+def test_slow_rise_before_settle():
+    guard, _ = armed_guard()
+    rng = np.random.default_rng(0)
+    for k in range(10):
+        guard.feed('Ic', list(rng.normal(0.05 + 0.002 * k, 1e-4, 100)))
+    assert not guard.tripped
+
+def test_trip_on_ic_jump():
+    guard, _ = armed_guard()
+    guard.feed('Ic', [0.05] * 100)
+    with pytest.raises(BreakdownError):
+        guard.feed('Ic', [0.05] * 50 + [0.1] * 50)
+    assert guard.device.cut == 1
+
+def test_short_chunk_age(caplog):
+    # 短于 span 的数据块触发时, 日志中的延迟不能为负
+    guard, _ = armed_guard()
+    guard.feed('Vce', [20.0] * 100)
+    with pytest.raises(BreakdownError):
+        guard.feed('Vce', [5.0] * 3)
+    message = caplog.records[-1].getMessage()
+    sample = float(message.split('采样到检测 ')[1].split('ms')[0])
+    assert sample >= 0
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from mil_std_750.refer.solver import BroydenSolver, InfeasibleError, trim_step
+
+Vbe = 0.7
+
+def circuit(Vc, Ve, Rc, Vbe=Vbe):
+    '''理想电路: Vce = Vc - Ve, Ic = (Ve - Vbe) / Rc'''
+    return Vc - Ve, max(Ve - Vbe, 0) / Rc
+
+def test_converges_on_ideal_circuit():
+    solver = BroydenSolver(20, 0.05, 100, 200, 60)
+    Vc, Ve = 23, 3
+    for _ in range(5):
+        Vce, Ic = circuit(Vc, Ve, 100)
+        if solver.error(Vce, Ic) < 1e-3: break
+        solver.update(Vc, Ve, Vce, Ic)
+        Vc, Ve = solver.propose((10, 5))
+    assert solver.error(*circuit(Vc, Ve, 100)) < 1e-3
+
+def test_step_scaled_when_ve_clips():
+    # Ve 越限时整步缩短, Vc 不会单独继续增大
+    solver = BroydenSolver(20, 0.1, 1000, 200, 60)
+    solver.update(70, 50, *circuit(70, 50, 1000))
+    Vc, Ve = solver.propose((100, 100))
+    assert Ve == pytest.approx(60)
+    assert Vc - Ve == pytest.approx(20, abs=0.1)
+
+def test_infeasible_when_ve_saturated():
+    solver = BroydenSolver(20, 0.1, 1000, 200, 60)
+    solver.update(80, 60, *circuit(80, 60, 1000))
+    with pytest.raises(InfeasibleError):
+        solver.propose((100, 100))
+
+def test_vc_only_when_ic_matched_at_limit():
+    # Ic 已在判定范围内时, Ve 受限仍可单独调整 Vc 修正 Vce
+    solver = BroydenSolver(20, 0.0595, 1000, 200, 60)
+    solver.update(75, 60, *circuit(75, 60, 1000))
+    Vc, Ve = solver.propose((100, 100))
+    assert Ve == pytest.approx(60)
+    assert Vc - Ve == pytest.approx(20, rel=0.01)
+
+def test_pnp_sign():
+    solver = BroydenSolver(-20, 0.05, 100, 200, 60)
+    assert np.allclose(solver.J, [[-1, 1], [0, 0.01]])
+
+def test_trim_vc_follows_clamped_ve():
+    # dVe 被限制到 +20V 时 Vc 也只增加 20V 加上 Vce 的修正
+    Vc, Ve = trim_step(121.2, 100, 40, -1.2, 20, 30, 200, 200)
+    assert Ve == pytest.approx(120)
+    assert Vc - Ve == pytest.approx(20)
+
+def test_trim_vc_clip_shrinks_ve():
+    # Vc 到达限值时 Ve 同步缩小, Vce 不会因 Ve 单独增大而降得更多
+    Vc, Ve = trim_step(195, 175, 10, 0, 20, 30, 200, 200)
+    assert Vc == pytest.approx(200)
+    assert Vc - Ve == pytest.approx(20)
+
+def test_trim_ve_range():
+    Vc, Ve = trim_step(22, 2, -5, 0, 20, 30, 200, 200)
+    assert Ve == pytest.approx(0)
+    assert Vc - Ve == pytest.approx(20)
+
+def test_trim_vce_never_overshoots():
+    rng = np.random.default_rng(1)
+    for _ in range(1000):
+        Ve = rng.uniform(0, 60)
+        Vc = Ve + rng.uniform(0, 120 - Ve)
+        dVe, dVce = rng.normal(0, 20), rng.normal(0, 10)
+        newVc, newVe = trim_step(Vc, Ve, dVe, dVce, 10, 15, 120, 60)
+        assert 0 <= newVe <= 60 and 0 <= newVc <= 120
+        change = (newVc - newVe) - (Vc - Ve)
+        # Vce 只朝 dVce 的方向变化, 且不超过 dVce
+        assert change * dVce >= -1e-9 and abs(change) <= abs(dVce) + 1e-9
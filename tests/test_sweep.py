@@ -0,0 +1,33 @@
+import math
+import pytest
+from mil_std_750.refer.sweep import soa_targets
+
+curve = [(10, 1.0), (50, 0.2), (200, 0.01)]
+
+def test_endpoints_and_derating():
+    targets = soa_targets(curve, 0.8, 6)
+    assert len(targets) == 6
+    assert (targets[0].Vce, targets[0].Ic) == (10, pytest.approx(0.8))
+    assert (targets[-1].Vce, targets[-1].Ic) == (200, pytest.approx(0.008))
+    assert all(t.Rc == 'auto' and t.Re == 'auto' for t in targets)
+
+def test_points_on_boundary():
+    # 每个点都在对数坐标的折线上, Vce 递增、Ic 递减
+    targets = soa_targets(curve, 1.0, 9)
+    for a, b in zip(targets, targets[1:]):
+        assert b.Vce > a.Vce and b.Ic < a.Ic
+    for t in targets:
+        for (v0, i0), (v1, i1) in zip(curve, curve[1:]):
+            if v0 <= t.Vce <= v1:
+                x = (math.log10(t.Vce) - math.log10(v0)) / (math.log10(v1) - math.log10(v0))
+                expect = 10 ** (math.log10(i0) + (math.log10(i1) - math.log10(i0)) * x)
+                assert t.Ic == pytest.approx(expect, rel=0.01)
+
+def test_unsorted_and_invalid_points():
+    targets = soa_targets([(200, 0.01), (0, 1.0), (10, 1.0)], 1.0, 3)
+    assert [t.Vce for t in targets][0] == 10 and targets[-1].Vce == 200
+
+def test_degenerate():
+    assert soa_targets([], 0.8, 5) == []
+    assert len(soa_targets([(10, 1.0)], 0.8, 5)) == 1
+    assert len(soa_targets(curve, 0.8, 1)) == 1
@@ -0,0 +1,57 @@
+import math
+import numpy as np
+import pytest
+from mil_std_750.worker.window import SlidingWindow, SettlePredictor, BatchMeans
+
+def test_sliding_window_matches_numpy():
+    rng = np.random.default_rng(0)
+    data = list(rng.normal(5, 1, 1000) + np.arange(1000) * 0.01)
+    window = SlidingWindow(100, 1000)
+    for i in range(0, len(data), 37):
+        window.feed(data[:i + 37])
+        tail = np.array(data[max(0, min(i + 37, len(data)) - 100):min(i + 37, len(data))])
+        assert window.mean == pytest.approx(tail.mean())
+        assert window.variance == pytest.approx(tail.var(ddof=1))
+        assert window.min == tail.min() and window.max == tail.max()
+        k = np.polyfit(np.arange(len(tail)), tail, 1)[0]
+        assert window.slope == pytest.approx(k * 1000)
+
+def test_sliding_window_full_and_reset():
+    window = SlidingWindow(10, 100)
+    values = [1.0] * 5
+    window.feed(values)
+    assert not window.full and window.count == 5
+    values.extend([2.0] * 10)
+    window.feed(values)
+    assert window.full and window.mean == 2.0 and window.slope == 0.0
+    # 列表被清空后重新开始
+    window.feed([3.0])
+    assert window.count == 1 and window.mean == 3.0
+    assert math.isnan(window.variance)
+
+def test_settle_predictor_exponential():
+    rate, tau = 1000, 0.2
+    t = np.arange(int(rate * 0.6)) / rate
+    values = list(10 - 5 * np.exp(-t / tau))
+    predictor = SettlePredictor(rate)
+    predictor.feed(values)
+    p = predictor.predict(0.01)
+    assert p is not None
+    assert p.asymptote == pytest.approx(10, abs=1e-3)
+    assert p.tau == pytest.approx(tau, rel=1e-2)
+    assert p.residual == pytest.approx(5 * math.exp(-0.6 / tau), rel=0.05)
+    assert p.settle_time > p.elapsed
+
+def test_settle_predictor_flat_noise():
+    rng = np.random.default_rng(1)
+    predictor = SettlePredictor(1000)
+    predictor.feed(list(rng.normal(1, 0.01, 600)))
+    assert predictor.predict(0.01) is None
+
+def test_batch_means():
+    rng = np.random.default_rng(2)
+    values = list(rng.normal(0, 1, 4000))
+    batches = BatchMeans(100).feed(values)
+    assert batches.mean == pytest.approx(np.mean(values))
+    assert batches.stderr == pytest.approx(1 / math.sqrt(4000), rel=0.3)
+    assert math.isnan(BatchMeans(100).feed(values[:300]).stderr)